@@ -1,14 +1,23 @@
 """
 Flask API server for LLM Analysis Quiz
+
+Production deployments serve asgi.py instead, which keeps one event loop
+(and the clients and caches bound to it) alive for the whole process.
 """
 import asyncio
 import logging
+import threading
 from flask import Flask, request, jsonify
+from circuit_breaker import get_llm_breaker
 from config import Config
-from quiz_solver import QuizSolver
+from loop_monitor import loop_stats
+from model_router import get_model_router
+from state_store import get_state_store
+from token_ledger import get_token_ledger
+from quiz_service import get_job, profile_requested, solve_quiz_coalesced, validate_quiz_payload
+from quiz_service import ready as worker_ready
+from warmup import warm_up
 from utils import (
-    is_valid_url,
-    is_valid_email,
     format_error_response,
     format_success_response,
     log_request
@@ -32,6 +41,11 @@ except ValueError as e:
     logger.error(f"Configuration error: {e}")
     raise
 
+# Each request runs its own event loop here, so there is no shared LLM client
+# to pre-connect; warm DNS, parsers and the parse pool in the background instead
+if Config.WARMUP_ENABLED:
+    threading.Thread(target=lambda: asyncio.run(warm_up()), name="warmup", daemon=True).start()
+
 
 @app.route('/', methods=['GET'])
 def home():
@@ -42,7 +56,9 @@ def home():
         "version": "1.0.0",
         "endpoints": {
             "quiz": "/quiz (POST)",
-            "health": "/ (GET)"
+            "health": "/ (GET)",
+            "ready": "/ready (GET)",
+            "job": "/jobs/<job_id> (GET)"
         }
     }), 200
 
@@ -53,10 +69,31 @@ def health():
     return jsonify({
         "status": "healthy",
         "openai_configured": bool(Config.OPENAI_API_KEY),
-        "secret_configured": bool(Config.SECRET_KEY)
+        "secret_configured": bool(Config.SECRET_KEY),
+        "models": get_model_router().stats.report(),
+        "state_store": get_state_store().backend,
+        "tokens": get_token_ledger().report(),
+        "llm_breaker": get_llm_breaker().stats(),
+        "event_loop": loop_stats()
     }), 200
 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until warm, or while LLM or parse capacity is saturated"""
+    is_ready, report = worker_ready()
+    return jsonify(report), 200 if is_ready else 503
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status of a quiz chain, whichever worker or instance ran it"""
+    job = get_job(job_id)
+    if job is None:
+        return format_error_response("Job not found", 404)
+    return jsonify(job), 200
+
+
 @app.route('/quiz', methods=['POST'])
 def handle_quiz():
     """
@@ -76,33 +113,13 @@ def handle_quiz():
             return format_error_response("Request must be JSON", 400)
         
         data = request.get_json()
+        error = validate_quiz_payload(data)
+        if error:
+            return error
         
-        # Validate required fields
-        email = data.get('email')
-        secret = data.get('secret')
-        quiz_url = data.get('url')
-        
-        if not all([email, secret, quiz_url]):
-            logger.warning("Invalid request: missing required fields")
-            return format_error_response(
-                "Missing required fields: email, secret, url", 
-                400
-            )
-        
-        # Validate email format
-        if not is_valid_email(email):
-            logger.warning(f"Invalid email format: {email}")
-            return format_error_response("Invalid email format", 400)
-        
-        # Validate URL format
-        if not is_valid_url(quiz_url):
-            logger.warning(f"Invalid URL format: {quiz_url}")
-            return format_error_response("Invalid URL format", 400)
-        
-        # Validate secret
-        if secret != Config.SECRET_KEY:
-            logger.warning(f"Invalid secret for email: {email}")
-            return format_error_response("Invalid secret", 403)
+        email = data['email']
+        secret = data['secret']
+        quiz_url = data['url']
         
         # Log the request
         log_request(email, quiz_url, "received")
@@ -110,8 +127,10 @@ def handle_quiz():
         # Process the quiz asynchronously
         logger.info(f"Starting quiz solver for {quiz_url}")
         
-        # Run the async quiz solver
-        result = asyncio.run(solve_quiz_async(email, secret, quiz_url))
+        # Run the async quiz solver, joining an identical in-flight chain if any
+        result = asyncio.run(solve_quiz_coalesced(
+            email, secret, quiz_url, profile=profile_requested(request.headers)
+        ))
         
         if result.get('status') in ['completed', 'partial']:
             return format_success_response({
@@ -130,20 +149,6 @@ def handle_quiz():
         return format_error_response(f"Internal server error: {str(e)}", 500)
 
 
-async def solve_quiz_async(email: str, secret: str, quiz_url: str):
-    """Async wrapper for quiz solving"""
-    try:
-        solver = QuizSolver()
-        result = await solver.solve_quiz(email, secret, quiz_url)
-        return result
-    except Exception as e:
-        logger.error(f"Error in quiz solver: {e}", exc_info=True)
-        return {
-            "status": "error",
-            "error": str(e)
-        }
-
-
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
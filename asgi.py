@@ -0,0 +1,180 @@
+"""
+ASGI API server for LLM Analysis Quiz
+
+Serves the same routes as app.py on one long-lived event loop per worker, so
+the LLM client, connection pools, caches and background tasks are shared by
+every quiz chain the worker handles. Run with:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 2
+"""
+import logging
+from quart import Quart, request, jsonify
+import quiz_service
+from circuit_breaker import get_llm_breaker
+from config import Config
+from loop_monitor import loop_stats
+from model_router import get_model_router
+from state_store import get_state_store
+from token_ledger import get_token_ledger
+from utils import (
+    format_error_response,
+    format_success_response,
+    log_request
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Initialize Quart app
+app = Quart(__name__)
+
+# Validate configuration on startup
+try:
+    Config.validate()
+    logger.info("Configuration validated successfully")
+except ValueError as e:
+    logger.error(f"Configuration error: {e}")
+    raise
+
+
+@app.before_serving
+async def startup():
+    """Create process-wide resources on the serving event loop"""
+    await quiz_service.startup()
+
+
+@app.after_serving
+async def shutdown():
+    """Release process-wide resources"""
+    await quiz_service.shutdown()
+
+
+@app.route('/', methods=['GET'])
+async def home():
+    """Health check endpoint"""
+    return jsonify({
+        "status": "online",
+        "service": "LLM Analysis Quiz Solver",
+        "version": "1.0.0",
+        "endpoints": {
+            "quiz": "/quiz (POST)",
+            "health": "/ (GET)",
+            "ready": "/ready (GET)",
+            "job": "/jobs/<job_id> (GET)"
+        }
+    }), 200
+
+
+@app.route('/health', methods=['GET'])
+async def health():
+    """Detailed health check"""
+    return jsonify({
+        "status": "healthy",
+        "openai_configured": bool(Config.OPENAI_API_KEY),
+        "secret_configured": bool(Config.SECRET_KEY),
+        "models": get_model_router().stats.report(),
+        "state_store": get_state_store().backend,
+        "tokens": get_token_ledger().report(),
+        "llm_breaker": get_llm_breaker().stats(),
+        "event_loop": loop_stats()
+    }), 200
+
+
+@app.route('/ready', methods=['GET'])
+async def ready():
+    """Readiness probe: 503 until warm, or while LLM or parse capacity is saturated"""
+    is_ready, report = quiz_service.ready()
+    return jsonify(report), 200 if is_ready else 503
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    """Status of a quiz chain, whichever worker or instance ran it"""
+    job = quiz_service.get_job(job_id)
+    if job is None:
+        return format_error_response("Job not found", 404)
+    return jsonify(job), 200
+
+
+@app.route('/quiz', methods=['POST'])
+async def handle_quiz():
+    """
+    Main endpoint for receiving quiz requests
+    
+    Expected JSON payload:
+    {
+        "email": "user@example.com",
+        "secret": "user_secret",
+        "url": "https://example.com/quiz-123"
+    }
+    """
+    try:
+        # Validate JSON payload
+        if not request.is_json:
+            logger.warning("Invalid request: not JSON")
+            return format_error_response("Request must be JSON", 400)
+        
+        data = await request.get_json()
+        error = quiz_service.validate_quiz_payload(data)
+        if error:
+            return error
+        
+        email = data['email']
+        secret = data['secret']
+        quiz_url = data['url']
+        
+        # Log the request
+        log_request(email, quiz_url, "received")
+        logger.info(f"Starting quiz solver for {quiz_url}")
+        
+        # Solve on the worker's event loop, joining an identical in-flight chain if any
+        result = await quiz_service.solve_quiz_coalesced(
+            email, secret, quiz_url,
+            profile=quiz_service.profile_requested(request.headers)
+        )
+        
+        if result.get('status') in ['completed', 'partial']:
+            return format_success_response({
+                "message": "Quiz solving initiated",
+                "url": quiz_url,
+                "result": result
+            })
+        else:
+            return format_error_response(
+                f"Quiz solving failed: {result.get('error', 'Unknown error')}", 
+                500
+            )
+        
+    except Exception as e:
+        logger.error(f"Error handling quiz request: {e}", exc_info=True)
+        return format_error_response(f"Internal server error: {str(e)}", 500)
+
+
+@app.errorhandler(404)
+async def not_found(error):
+    """Handle 404 errors"""
+    return jsonify({
+        "error": "Endpoint not found",
+        "status": "error"
+    }), 404
+
+
+@app.errorhandler(500)
+async def internal_error(error):
+    """Handle 500 errors"""
+    logger.error(f"Internal server error: {error}")
+    return jsonify({
+        "error": "Internal server error",
+        "status": "error"
+    }), 500
+
+
+if __name__ == '__main__':
+    import uvicorn
+    
+    logger.info(f"Starting ASGI app on {Config.HOST}:{Config.PORT}")
+    uvicorn.run(app, host=Config.HOST, port=Config.PORT)
@@ -0,0 +1,196 @@
+"""
+Solve many quiz chains from the command line
+
+Reads one quiz per line from a file or stdin, either a bare URL (credentials
+from --email/--secret or the EMAIL/SECRET_KEY settings) or a JSON object with
+"url" and optionally "email" and "secret". Chains run concurrently up to
+--concurrency, and one JSON line per chain is written as soon as it finishes.
+
+    python batch_solve.py quizzes.txt --concurrency 8 --output results.jsonl
+    cat quizzes.jsonl | python batch_solve.py - > results.jsonl
+
+With --record DIR every chain's traffic is saved as a cassette; --replay DIR
+serves the same chains from those cassettes (or from ones recorded in
+production with CASSETTE_RECORD) without touching the network or needing an
+OPENAI_API_KEY, to benchmark the solver itself. A chain without a cassette is
+reported with status "error":
+
+    python batch_solve.py quizzes.txt --record cassettes/
+    python batch_solve.py quizzes.txt --replay cassettes/ --latency zero
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, TextIO
+
+import quiz_service
+from cassette import RECORD, REPLAY, cassette_key, use_cassette
+from config import Config
+from profiler import stage_timings
+
+logger = logging.getLogger(__name__)
+
+
+def parse_jobs(lines, email: Optional[str], secret: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Turn input lines into jobs
+
+    Blank lines and lines starting with # are skipped.
+
+    Returns:
+        Jobs with 'line', 'url', 'email' and 'secret'
+    """
+    jobs = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            entry = json.loads(line)
+        else:
+            entry = {"url": line}
+        jobs.append({
+            "line": number,
+            "url": entry["url"],
+            "email": entry.get("email") or email,
+            "secret": entry.get("secret") or secret
+        })
+    return jobs
+
+
+def find_cassette(directory: str, email: str, quiz_url: str) -> Optional[str]:
+    """Most recent cassette recorded for a chain"""
+    matches = sorted(glob.glob(os.path.join(directory, f"{cassette_key(email, quiz_url)}*.cassette.json.gz")))
+    return matches[-1] if matches else None
+
+
+def _cassette_for(job: Dict[str, Any], cassettes: Dict[str, Any]):
+    """Recording or replay context for a job, per the --record/--replay options"""
+    if cassettes.get("record"):
+        path = os.path.join(cassettes["record"],
+                            f"{cassette_key(job['email'], job['url'])}-{int(time.time())}.cassette.json.gz")
+        return use_cassette(path, RECORD, meta={"email": job["email"], "url": job["url"]})
+    if cassettes.get("replay"):
+        path = find_cassette(cassettes["replay"], job["email"], job["url"])
+        if path is None:
+            raise FileNotFoundError(f"No cassette for line {job['line']} in {cassettes['replay']}")
+        return use_cassette(path, REPLAY, latency=cassettes.get("latency", 'original'))
+    return nullcontext()
+
+
+async def _run_job(job: Dict[str, Any], semaphore: asyncio.Semaphore,
+                   cassettes: Dict[str, Any]) -> Dict[str, Any]:
+    async with semaphore:
+        started = time.monotonic()
+        try:
+            with _cassette_for(job, cassettes), stage_timings() as stages:
+                result = await quiz_service.solve_quiz_async(job["email"], job["secret"], job["url"])
+        except Exception as e:
+            # A missing or unreadable cassette fails this chain, not the batch
+            logger.error(f"Line {job['line']} failed: {e}")
+            return {
+                "line": job["line"],
+                "url": job["url"],
+                "email": job["email"],
+                "status": "error",
+                "error": str(e),
+                "wall_time": round(time.monotonic() - started, 3)
+            }
+        return {
+            "line": job["line"],
+            "url": job["url"],
+            "email": job["email"],
+            "status": result.get("status"),
+            "wall_time": round(time.monotonic() - started, 3),
+            "stages": {
+                name: {"seconds": round(stage["seconds"], 3), "count": stage["count"]}
+                for name, stage in stages.items()
+            },
+            "result": result
+        }
+
+
+async def run_batch(jobs: List[Dict[str, Any]], concurrency: int, out: TextIO,
+                    cassettes: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Solve every job, writing one JSON line per finished chain
+    
+    Args:
+        cassettes: 'record' or 'replay' directory and replay 'latency'
+
+    Returns:
+        Number of chains that did not complete
+    """
+    cassettes = cassettes or {}
+    await quiz_service.startup(replay=bool(cassettes.get("replay")))
+    failures = 0
+    try:
+        # Keep warmup work out of the timings of the first chains
+        await quiz_service.wait_until_warm()
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [asyncio.create_task(_run_job(job, semaphore, cassettes)) for job in jobs]
+        for finished in asyncio.as_completed(tasks):
+            record = await finished
+            if record["status"] != "completed":
+                failures += 1
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+    finally:
+        await quiz_service.shutdown()
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Solve many quiz chains concurrently")
+    parser.add_argument("input", help="File with one quiz URL or JSON object per line, or - for stdin")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Chains solved at once (default 4)")
+    parser.add_argument("-o", "--output", help="JSONL output file (default stdout)")
+    parser.add_argument("--email", default=Config.EMAIL, help="Email for lines without one")
+    parser.add_argument("--secret", default=Config.SECRET_KEY, help="Secret for lines without one")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="DIR", help="Record each chain's traffic as a cassette in DIR")
+    mode.add_argument("--replay", metavar="DIR", help="Serve each chain from its cassette in DIR")
+    parser.add_argument("--latency", choices=("original", "zero"), default="original",
+                        help="Replay with the recorded latencies or none (default original)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+
+    if args.input == '-':
+        jobs = parse_jobs(sys.stdin, args.email, args.secret)
+    else:
+        with open(args.input) as f:
+            jobs = parse_jobs(f, args.email, args.secret)
+
+    missing = [job["line"] for job in jobs if not job["email"] or not job["secret"]]
+    if missing:
+        parser.error(f"No email/secret for input lines {missing}; pass --email/--secret")
+    if not jobs:
+        logger.warning("No quiz URLs in input")
+        return 0
+
+    logger.info(f"Solving {len(jobs)} quiz chains, {args.concurrency} at a time")
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        cassettes = {"record": args.record, "replay": args.replay, "latency": args.latency}
+        failures = asyncio.run(run_batch(jobs, max(1, args.concurrency), out, cassettes))
+    finally:
+        if args.output:
+            out.close()
+    logger.info(f"{len(jobs) - failures}/{len(jobs)} chains completed")
+    return 1 if failures else 0
+
+
+# The guard matters: parse pool workers re-import the main module when started
+if __name__ == '__main__':
+    sys.exit(main())
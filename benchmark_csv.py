@@ -0,0 +1,71 @@
+"""
+Compare CSV parsing engines on synthetic files
+
+Generates mixed-type CSVs of several sizes and times each engine of
+csv_reader on them, including the full DataProcessor.read_csv path with
+sniffing. Use it to pick CSV_ENGINE and CSV_ARROW_MIN_BYTES for a machine:
+
+    python benchmark_csv.py
+    python benchmark_csv.py --sizes 1 10 100 --repeat 5
+"""
+import argparse
+import io
+import statistics
+import sys
+import time
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from csv_reader import ENGINES, HAVE_PYARROW, sniff_dialect
+from data_processor import DataProcessor
+
+
+def make_csv(size_mb: float, seed: int = 0) -> bytes:
+    """Synthetic CSV of roughly size_mb megabytes with int, float, text and date columns"""
+    rng = np.random.default_rng(seed)
+    rows = max(1, int(size_mb * 1024 * 1024 / 34))  # about 34 bytes per row
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "value": rng.normal(100, 25, rows).round(3),
+        "count": rng.integers(0, 10_000, rows),
+        "category": rng.choice(["alpha", "beta", "gamma", "delta"], rows),
+        "date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+    })
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode("utf-8")
+
+
+def time_call(fn, repeat: int) -> float:
+    """Median wall time of fn over repeat runs, in seconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark CSV parsing engines")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[0.0625, 1, 10, 50],
+                        help="File sizes in MB (default 0.0625 1 10 50)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (default 3)")
+    args = parser.parse_args(argv)
+
+    engines = [name for name in ENGINES if name != "pyarrow" or HAVE_PYARROW]
+    processor = DataProcessor()
+    print(f"{'size':>10} " + " ".join(f"{name:>10}" for name in engines) + f" {'read_csv':>10}")
+    for size_mb in args.sizes:
+        content = make_csv(size_mb)
+        options = sniff_dialect(content)
+        timings = [time_call(lambda: ENGINES[name](content, options), args.repeat) for name in engines]
+        timings.append(time_call(lambda: processor.read_csv(content), args.repeat))
+        print(f"{len(content) / 1024 / 1024:>8.2f}MB " + " ".join(f"{t * 1000:>8.1f}ms" for t in timings))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
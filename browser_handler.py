@@ -1,17 +1,30 @@
 """
 Browser handler - simplified to use requests only
 """
+import asyncio
 import logging
-import requests
 from bs4 import BeautifulSoup
+from cassette import active_cassette, requests_session
+from singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Identical concurrent page fetches share one HTTP request
+_page_flight = SingleFlight("page_fetch")
+
 
 async def render_quiz_page(url: str) -> tuple[str, str]:
-    """Fetch page using HTTP request"""
+    """Fetch page using HTTP request, coalescing duplicate in-flight fetches"""
+    if active_cassette() is not None:
+        # Every recorded chain needs its own copy of the exchange
+        return await asyncio.to_thread(_fetch_page, url)
+    return await _page_flight.do(url, lambda: asyncio.to_thread(_fetch_page, url))
+
+
+def _fetch_page(url: str) -> tuple[str, str]:
+    """Fetch and parse a page (blocking)"""
     try:
-        response = requests.get(url, timeout=30, headers={
+        response = requests_session().get(url, timeout=30, headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         response.raise_for_status()
@@ -0,0 +1,361 @@
+"""
+Record and replay the network traffic of quiz chains
+
+In record mode every HTTP exchange of a chain (page fetches, file downloads,
+answer submissions) and every LLM request is captured, with its timing, into
+a gzip-compressed cassette. In replay mode the same chain is served entirely
+from the cassette, either with the recorded latencies or with none, so the
+solver's own CPU and scheduling overhead can be benchmarked offline and
+compared across versions.
+
+Request bodies and headers are stored only as hashes, so credentials sent with
+a submission or an LLM call never end up in a cassette.
+"""
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# Replayed LLM responses never reach the API, but AsyncOpenAI refuses to start without a key
+REPLAY_API_KEY = 'cassette-replay'
+
+# Response headers kept for plain HTTP exchanges; bodies are stored decoded
+_HTTP_HEADERS = ('content-type', 'content-disposition')
+
+_active: ContextVar[Optional['Cassette']] = ContextVar('cassette', default=None)
+
+
+class CassetteMiss(requests.ConnectionError):
+    """Raised in replay mode for a request the cassette has no response for"""
+
+
+def cassette_key(email: str, quiz_url: str) -> str:
+    """File name stem identifying the chain a cassette belongs to"""
+    return hashlib.sha256(f"{email.lower()}\n{quiz_url}".encode('utf-8')).hexdigest()[:16]
+
+
+def _body_hash(kind: str, body: Optional[bytes]) -> str:
+    body = body or b''
+    if kind == 'llm':
+        # Match on model and messages only: max_tokens adapts between runs
+        try:
+            payload = json.loads(body)
+            body = json.dumps([payload.get('model'), payload.get('messages')], sort_keys=True).encode('utf-8')
+        except ValueError:
+            pass
+    return hashlib.sha256(body).hexdigest()[:24]
+
+
+def _encode(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii')
+
+
+def _decode(data: str) -> bytes:
+    return base64.b64decode(data)
+
+
+class Cassette:
+    """Interactions of one chain, in the order they were recorded"""
+
+    def __init__(self, path: str, mode: str, latency: str = 'original',
+                 meta: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            path: Cassette file (.cassette.json.gz)
+            mode: RECORD or REPLAY
+            latency: In replay, 'original' to wait the recorded times, 'zero' to skip them
+            meta: Stored with a recording, e.g. the quiz URL
+        """
+        self.path = path
+        self.mode = mode
+        self.zero_latency = latency == 'zero'
+        self.meta = meta or {}
+        self.interactions: List[Dict[str, Any]] = []
+        self._used: List[bool] = []
+        self._lock = threading.Lock()
+        if mode == REPLAY:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            self.meta = data.get('meta', {})
+            self.interactions = data['interactions']
+            self._used = [False] * len(self.interactions)
+
+    def add(self, interaction: Dict[str, Any]):
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def match(self, kind: str, method: str, url: str, body: Optional[bytes]) -> Dict[str, Any]:
+        """
+        Next unused recorded interaction for a request
+
+        Prefers an exact body match and falls back to the next one for the same
+        URL, since request bodies can legitimately differ between versions.
+
+        Raises:
+            CassetteMiss: If nothing was recorded for the URL
+        """
+        digest = _body_hash(kind, body)
+        with self._lock:
+            fallback = None
+            for i, entry in enumerate(self.interactions):
+                if self._used[i] or entry['kind'] != kind or entry['method'] != method or entry['url'] != url:
+                    continue
+                if entry['body_hash'] == digest:
+                    fallback = i
+                    break
+                if fallback is None:
+                    fallback = i
+            if fallback is None:
+                raise CassetteMiss(f"No recorded response for {method} {url}")
+            self._used[fallback] = True
+            return self.interactions[fallback]
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {"version": 1, "meta": self.meta, "interactions": self.interactions}
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        logger.info(f"Cassette with {len(data['interactions'])} interactions written to {self.path}")
+
+
+class _CassetteAdapter(HTTPAdapter):
+    """requests transport adapter that records through to the network or replays"""
+
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, stream=False, **kwargs):
+        body = request.body.encode('utf-8') if isinstance(request.body, str) else request.body
+        if self.cassette.mode == REPLAY:
+            entry = self.cassette.match('http', request.method, request.url, body)
+            if not self.cassette.zero_latency:
+                time.sleep(entry['latency'])
+            return self._replayed_response(entry, request)
+
+        started = time.perf_counter()
+        response = super().send(request, stream=stream, **kwargs)
+        content = response.content  # recording reads the whole body up front
+        self.cassette.add({
+            "kind": "http",
+            "method": request.method,
+            "url": request.url,
+            "body_hash": _body_hash('http', body),
+            "status": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() in _HTTP_HEADERS},
+            "latency": round(time.perf_counter() - started, 4),
+            "body": _encode(content)
+        })
+        return response
+
+    @staticmethod
+    def _replayed_response(entry: Dict[str, Any], request) -> requests.Response:
+        content = _decode(entry['body'])
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers['Content-Length'] = str(len(content))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.reason = 'Replayed'
+        return response
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """Passes a streamed LLM response through while timing each raw chunk"""
+
+    def __init__(self, inner: httpx.AsyncByteStream, entry: Dict[str, Any], cassette: Cassette):
+        self.inner = inner
+        self.entry = entry
+        self.cassette = cassette
+        self.started = time.perf_counter()
+
+    async def __aiter__(self):
+        async for chunk in self.inner:
+            self.entry['chunks'].append([round(time.perf_counter() - self.started, 4), _encode(chunk)])
+            yield chunk
+
+    async def aclose(self):
+        await self.inner.aclose()
+        # Streams closed early keep what was received; replay stops at the same point
+        self.cassette.add(self.entry)
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[List], zero_latency: bool):
+        self.chunks = chunks
+        self.zero_latency = zero_latency
+
+    async def __aiter__(self):
+        last = 0.0
+        for offset, chunk in self.chunks:
+            if not self.zero_latency and offset > last:
+                await asyncio.sleep(offset - last)
+            last = offset
+            yield _decode(chunk)
+
+    async def aclose(self):
+        pass
+
+
+class _CassetteTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that records or replays
+
+    'llm' exchanges keep the timing of every streamed chunk; 'http' exchanges
+    are stored like those of the requests adapter, so a submission replays
+    the same whichever client recorded it.
+    """
+
+    def __init__(self, cassette: Cassette, kind: str = 'llm'):
+        self.cassette = cassette
+        self.kind = kind
+        self._inner = httpx.AsyncHTTPTransport() if cassette.mode == RECORD else None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        url = str(request.url)
+        if self.cassette.mode == REPLAY:
+            entry = self.cassette.match(self.kind, request.method, url, body)
+            if not self.cassette.zero_latency:
+                await asyncio.sleep(entry['latency'])
+            if self.kind == 'http':
+                return httpx.Response(entry['status'], headers=entry['headers'],
+                                      content=_decode(entry['body']))
+            return httpx.Response(entry['status'], headers=entry['headers'],
+                                  stream=_ReplayStream(entry['chunks'], self.cassette.zero_latency))
+
+        started = time.perf_counter()
+        response = await self._inner.handle_async_request(request)
+        if self.kind == 'http':
+            # Store the body decoded, as the requests adapter does
+            raw = httpx.Response(response.status_code, headers=response.headers, stream=response.stream)
+            try:
+                content = await raw.aread()
+            finally:
+                await raw.aclose()
+            self.cassette.add({
+                "kind": "http",
+                "method": request.method,
+                "url": url,
+                "body_hash": _body_hash('http', body),
+                "status": response.status_code,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() in _HTTP_HEADERS},
+                "latency": round(time.perf_counter() - started, 4),
+                "body": _encode(content)
+            })
+            headers = [(k, v) for k, v in response.headers.multi_items()
+                       if k.lower() not in ('content-encoding', 'transfer-encoding', 'content-length')]
+            return httpx.Response(response.status_code, headers=headers, content=content,
+                                  extensions=response.extensions)
+
+        entry = {
+            "kind": "llm",
+            "method": request.method,
+            "url": url,
+            "body_hash": _body_hash('llm', body),
+            "status": response.status_code,
+            "headers": [[k, v] for k, v in response.headers.multi_items()],
+            "latency": round(time.perf_counter() - started, 4),
+            "chunks": []
+        }
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_RecordingStream(response.stream, entry, self.cassette),
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        if self._inner is not None:
+            await self._inner.aclose()
+
+
+def active_cassette() -> Optional[Cassette]:
+    return _active.get()
+
+
+def requests_session():
+    """
+    HTTP client for page fetches and downloads
+
+    Returns a requests.Session bound to the active cassette, or the requests
+    module itself (same get/post API) when nothing is being recorded or replayed.
+    """
+    cassette = _active.get()
+    if cassette is None:
+        return requests
+    session = requests.Session()
+    adapter = _CassetteAdapter(cassette)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def http_transport() -> Optional[httpx.AsyncBaseTransport]:
+    """httpx transport for plain HTTP calls bound to the active cassette, or None"""
+    cassette = _active.get()
+    if cassette is None:
+        return None
+    return _CassetteTransport(cassette, kind='http')
+
+
+def llm_api_key() -> str:
+    """API key for a new LLM client: a placeholder while replaying, so replay needs no credentials"""
+    cassette = _active.get()
+    if cassette is not None and cassette.mode == REPLAY:
+        return REPLAY_API_KEY
+    return Config.OPENAI_API_KEY
+
+
+def llm_http_client() -> Optional[httpx.AsyncClient]:
+    """httpx client for AsyncOpenAI bound to the active cassette, or None"""
+    cassette = _active.get()
+    if cassette is None:
+        return None
+    return httpx.AsyncClient(transport=_CassetteTransport(cassette), timeout=None)
+
+
+@contextmanager
+def use_cassette(path: str, mode: str, latency: str = 'original',
+                 meta: Optional[Dict[str, Any]] = None):
+    """
+    Record or replay all quiz traffic started inside the block
+
+    A recording is saved when the block exits, also after an error.
+    """
+    cassette = Cassette(path, mode, latency, meta)
+    token = _active.set(cassette)
+    try:
+        yield cassette
+    finally:
+        _active.reset(token)
+        if mode == RECORD:
+            try:
+                cassette.save()
+            except Exception as e:
+                logger.error(f"Could not save cassette {path}: {e}")
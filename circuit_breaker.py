@@ -0,0 +1,148 @@
+"""
+Circuit breaker for the LLM API
+
+Tracks the outcome and response latency (time until the response headers
+arrive) of recent LLM calls. When too many of them fail or are slow, the
+circuit opens and calls fail immediately with CircuitOpenError, so chains
+switch to their local solve path instead of waiting on a dead or overloaded
+API until the quiz deadline. After a cool-down a single probe call is let
+through; its success closes the circuit again.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Failure and slow-call rate breaker over a window of recent calls"""
+
+    def __init__(self, name: str, failure_rate: float, slow_call_seconds: float,
+                 slow_call_rate: float, window: int, min_calls: int, open_seconds: float):
+        """
+        Args:
+            name: Name used in logs
+            failure_rate: Fraction of failed calls in the window that opens the circuit
+            slow_call_seconds: Response latency above which a call counts as slow
+            slow_call_rate: Fraction of slow calls in the window that opens the circuit
+            window: Number of recent calls considered
+            min_calls: Calls needed in the window before it can open
+            open_seconds: Time the circuit stays open before a probe call
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_count = 0
+        self.rejected_count = 0
+        self._calls: deque = deque(maxlen=window)  # (ok, slow)
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; in half-open state only one probe at a time does"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                logger.info(f"{self.name} circuit half-open, probing")
+            # A probe that never reported back (e.g. cancelled) is replaced after a cool-down
+            if self.state == HALF_OPEN and (self._probe_started is None
+                                            or now - self._probe_started >= self.open_seconds):
+                self._probe_started = now
+                return True
+            self.rejected_count += 1
+            return False
+
+    def check(self):
+        """
+        Raises:
+            CircuitOpenError: If the call may not go ahead
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        """
+        Record the outcome of a call
+
+        Args:
+            ok: Whether the call succeeded
+            latency: Seconds until the service responded, if it did
+        """
+        slow = latency is not None and latency > self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_started = None
+                if ok and not slow:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"{self.name} circuit closed")
+                else:
+                    self._open()
+                return
+
+            self._calls.append((ok, slow))
+            if self.state == CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for call_ok, _ in self._calls if not call_ok) / len(self._calls)
+                slow_calls = sum(1 for _, call_slow in self._calls if call_slow) / len(self._calls)
+                if failures >= self.failure_rate or slow_calls >= self.slow_call_rate:
+                    self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_count += 1
+        self._opened_at = time.monotonic()
+        logger.warning(f"{self.name} circuit opened for {self.open_seconds:.0f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self._calls)
+            return {
+                "state": self.state,
+                "window_calls": len(calls),
+                "window_failures": sum(1 for ok, _ in calls if not ok),
+                "window_slow": sum(1 for _, slow in calls if slow),
+                "opened": self.opened_count,
+                "rejected": self.rejected_count
+            }
+
+
+_llm_breaker: Optional[CircuitBreaker] = None
+_init_lock = threading.Lock()
+
+
+def get_llm_breaker() -> CircuitBreaker:
+    """Process-wide breaker shared by all QuizSolver instances"""
+    global _llm_breaker
+    with _init_lock:
+        if _llm_breaker is None:
+            _llm_breaker = CircuitBreaker(
+                'LLM',
+                failure_rate=Config.LLM_BREAKER_FAILURE_RATE,
+                slow_call_seconds=Config.LLM_BREAKER_SLOW_SECONDS,
+                slow_call_rate=Config.LLM_BREAKER_SLOW_RATE,
+                window=Config.LLM_BREAKER_WINDOW,
+                min_calls=Config.LLM_BREAKER_MIN_CALLS,
+                open_seconds=Config.LLM_BREAKER_OPEN_SECONDS
+            )
+        return _llm_breaker
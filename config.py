@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -19,18 +20,103 @@ class Config:
     # OpenAI Configuration
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-turbo-preview')
+    # Tried first; escalates to OPENAI_MODEL on invalid or rejected answers.
+    # Set to the same value as OPENAI_MODEL to disable the cascade.
+    OPENAI_FAST_MODEL = os.getenv('OPENAI_FAST_MODEL', 'gpt-4o-mini')
     
     # Quiz Configuration
     QUIZ_TIMEOUT = int(os.getenv('QUIZ_TIMEOUT', 170))  # 170 seconds (under 3 min)
     MAX_RETRIES = int(os.getenv('MAX_RETRIES', 2))
     
+    # Answer submission: transient failures are retried until the quiz deadline
+    SUBMIT_TIMEOUT = float(os.getenv('SUBMIT_TIMEOUT', 30))  # per attempt
+    SUBMIT_MAX_ATTEMPTS = int(os.getenv('SUBMIT_MAX_ATTEMPTS', 8))
+    SUBMIT_BACKOFF_BASE = float(os.getenv('SUBMIT_BACKOFF_BASE', 0.25))
+    SUBMIT_BACKOFF_MAX = float(os.getenv('SUBMIT_BACKOFF_MAX', 4.0))
+    
+    # LLM Rate Limiting
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', 500))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', 200000))
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+    LLM_PER_EMAIL_CONCURRENCY = int(os.getenv('LLM_PER_EMAIL_CONCURRENCY', 2))
+    
+    # LLM circuit breaker: while open, chains solve with local templates only
+    LLM_BREAKER_FAILURE_RATE = float(os.getenv('LLM_BREAKER_FAILURE_RATE', 0.5))
+    LLM_BREAKER_SLOW_SECONDS = float(os.getenv('LLM_BREAKER_SLOW_SECONDS', 20))  # until response headers
+    LLM_BREAKER_SLOW_RATE = float(os.getenv('LLM_BREAKER_SLOW_RATE', 0.8))
+    LLM_BREAKER_WINDOW = int(os.getenv('LLM_BREAKER_WINDOW', 20))
+    LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', 5))
+    LLM_BREAKER_OPEN_SECONDS = float(os.getenv('LLM_BREAKER_OPEN_SECONDS', 30))
+
+    # Local question templates; pages matched with at least this confidence skip the analysis LLM call
+    LOCAL_TEMPLATES_ENABLED = os.getenv('LOCAL_TEMPLATES_ENABLED', 'True').lower() == 'true'
+    LOCAL_TEMPLATE_MIN_CONFIDENCE = float(os.getenv('LOCAL_TEMPLATE_MIN_CONFIDENCE', 0.8))
+
+    # Send files linked from the page with the analysis prompt when their parsed data is this small
+    SINGLE_PASS_ENABLED = os.getenv('SINGLE_PASS_ENABLED', 'True').lower() == 'true'
+    SINGLE_PASS_MAX_TOKENS = int(os.getenv('SINGLE_PASS_MAX_TOKENS', 3000))
+
+    # Event-loop lag monitoring; stack capture names the blocking call but costs a watchdog thread
+    LOOP_MONITOR_ENABLED = os.getenv('LOOP_MONITOR_ENABLED', 'True').lower() == 'true'
+    LOOP_MONITOR_INTERVAL_MS = float(os.getenv('LOOP_MONITOR_INTERVAL_MS', 100))
+    LOOP_STALL_THRESHOLD_MS = float(os.getenv('LOOP_STALL_THRESHOLD_MS', 200))
+    LOOP_STACK_CAPTURE = os.getenv('LOOP_STACK_CAPTURE', str(DEBUG)).lower() == 'true'
+    
+    # Token accounting: max_tokens shrinks to observed completion lengths
+    ADAPTIVE_MAX_TOKENS = os.getenv('ADAPTIVE_MAX_TOKENS', 'True').lower() == 'true'
+    ADAPTIVE_MAX_TOKENS_MIN_SAMPLES = int(os.getenv('ADAPTIVE_MAX_TOKENS_MIN_SAMPLES', 20))
+    ADAPTIVE_MAX_TOKENS_FLOOR = int(os.getenv('ADAPTIVE_MAX_TOKENS_FLOOR', 128))
+    # USD per million tokens, e.g. {"gpt-4o": [2.5, 10.0]}; overrides built-in prices
+    LLM_PRICES = json.loads(os.getenv('LLM_PRICES', '{}'))
+    
     # Browser Configuration
     HEADLESS = os.getenv('HEADLESS', 'True').lower() == 'true'
     BROWSER_TIMEOUT = int(os.getenv('BROWSER_TIMEOUT', 30000))  # 30 seconds
     
     # File Processing
     MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 10 * 1024 * 1024))  # 10MB
+    MAX_TOTAL_FILE_SIZE = int(os.getenv('MAX_TOTAL_FILE_SIZE', 25 * 1024 * 1024))  # all files of a step
+    MAX_DECOMPRESSED_SIZE = int(os.getenv('MAX_DECOMPRESSED_SIZE', 50 * 1024 * 1024))  # unpacked gz/bz2/zip
+    MAX_JOB_MEMORY = int(os.getenv('MAX_JOB_MEMORY', 256 * 1024 * 1024))  # file data held by one chain
+    SPILL_THRESHOLD = int(os.getenv('SPILL_THRESHOLD', 16 * 1024 * 1024))  # larger tables go to TEMP_DIR
     TEMP_DIR = os.getenv('TEMP_DIR', '/tmp')
+    DOWNLOAD_MAX_CONCURRENCY = int(os.getenv('DOWNLOAD_MAX_CONCURRENCY', 4))
+    # CSV parsing: auto, c, pyarrow or python; auto uses pyarrow from CSV_ARROW_MIN_BYTES up
+    CSV_ENGINE = os.getenv('CSV_ENGINE', 'auto')
+    CSV_ARROW_MIN_BYTES = int(os.getenv('CSV_ARROW_MIN_BYTES', 1024 * 1024))
+    CSV_ARROW_DTYPES = os.getenv('CSV_ARROW_DTYPES', 'True').lower() == 'true'  # Arrow-backed columns
+    # Tables with at least this many rows are summarized with approximate sketches
+    SKETCH_MIN_ROWS = int(os.getenv('SKETCH_MIN_ROWS', 100000))
+    SKETCH_TOP_K = int(os.getenv('SKETCH_TOP_K', 10))  # frequent values listed per column
+    PDF_TABLE_MAX_PAGES = int(os.getenv('PDF_TABLE_MAX_PAGES', 200))  # pages searched for tables
+    
+    # Shared state: empty = per-process, or redis://host:6379/0 to share
+    # job records, caches, answers and locks between workers and instances
+    STATE_STORE_URL = os.getenv('STATE_STORE_URL', '')
+    JOB_TTL = int(os.getenv('JOB_TTL', 3600))
+    MEMORY_STORE_MAX_BYTES = int(os.getenv('MEMORY_STORE_MAX_BYTES', 64 * 1024 * 1024))  # in-process store, LRU beyond
+    FILE_CACHE_MAX_BYTES = int(os.getenv('FILE_CACHE_MAX_BYTES', 1024 * 1024))  # 0 disables
+    FILE_CACHE_TTL = int(os.getenv('FILE_CACHE_TTL', 600))
+    
+    # Record every chain's traffic to TEMP_DIR/cassettes for offline replay
+    CASSETTE_RECORD = os.getenv('CASSETTE_RECORD', 'False').lower() == 'true'
+    
+    # Profiling: fraction of chains to profile (X-Quiz-Profile: 1 forces one)
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.0))
+    PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 10))
+    
+    # Warmup before the first quiz (DNS, LLM connection, parsers, parse pool)
+    WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'True').lower() == 'true'
+    WARMUP_STEP_TIMEOUT = float(os.getenv('WARMUP_STEP_TIMEOUT', 15))
+    
+    # Parse pool (0 workers = one per available core)
+    PARSE_POOL_WORKERS = int(os.getenv('PARSE_POOL_WORKERS', 0))
+    PARSE_QUEUE_SIZE = int(os.getenv('PARSE_QUEUE_SIZE', 8))
+    PARSE_POOL_MIN_BYTES = int(os.getenv('PARSE_POOL_MIN_BYTES', 256 * 1024))
+    
+    # Solved-quiz store (shared by all workers on the host)
+    QUIZ_STORE_ENABLED = os.getenv('QUIZ_STORE_ENABLED', 'True').lower() == 'true'
+    QUIZ_STORE_PATH = os.getenv('QUIZ_STORE_PATH', os.path.join(TEMP_DIR, 'quiz_store.sqlite3'))
     
     @classmethod
     def validate(cls):
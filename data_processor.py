@@ -5,39 +5,114 @@ import io
 import logging
 import os
 import tempfile
+import threading
 from typing import Any, Dict, List, Optional, Union
-import requests
+from urllib.parse import urlparse
 import pandas as pd
 import numpy as np
 from PIL import Image
 import PyPDF2
 import base64
 import json
+from cassette import requests_session
+from config import Config
+from csv_reader import read_delimited
+from file_sniffer import (
+    COMPRESSED_TYPES,
+    SNIFF_BYTES,
+    DecompressedSizeError,
+    StreamDecompressor,
+    extract_zip,
+    sniff_content,
+    strip_compression_suffix
+)
+from pdf_tables import extract_tables
+from sketches import exact_columns, sketch_columns
 
 logger = logging.getLogger(__name__)
 
 
+def _coalesce_head(chunks, min_bytes: int):
+    """Merge leading chunks until the first one holds at least min_bytes"""
+    chunks = iter(chunks)
+    head = bytearray()
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= min_bytes:
+            break
+    if head:
+        yield bytes(head)
+    yield from chunks
+
+
+class ByteBudget:
+    """Byte allowance shared by several concurrent downloads"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+    
+    def consume(self, amount: int) -> bool:
+        """Charge bytes against the budget; False once it is exceeded"""
+        with self._lock:
+            self.used += amount
+            return self.used <= self.limit
+    
+    def release(self, amount: int):
+        """Give back bytes of a download that was abandoned"""
+        with self._lock:
+            self.used -= amount
+
+
 class DataProcessor:
     """Handles data processing for various file formats"""
     
     def __init__(self):
         self.temp_dir = tempfile.gettempdir()
     
-    def download_file(self, url: str, max_size: int = 10 * 1024 * 1024) -> Optional[bytes]:
+    def download_file(self, url: str, max_size: int = 10 * 1024 * 1024,
+                      budget: Optional[ByteBudget] = None) -> Optional[bytes]:
         """
         Download a file from URL
         
         Args:
             url: File URL
             max_size: Maximum file size in bytes (default 10MB)
+            budget: Aggregate allowance shared with other downloads of the same step
             
         Returns:
             File content as bytes or None if failed
         """
+        fetched = self.fetch_file(url, max_size, budget, decompress=False)
+        return fetched['content'] if fetched else None
+    
+    def fetch_file(self, url: str, max_size: int = 10 * 1024 * 1024,
+                   budget: Optional[ByteBudget] = None, decompress: bool = True,
+                   max_decompressed: int = 50 * 1024 * 1024) -> Optional[Dict[str, Any]]:
+        """
+        Download a file, sniffing its type from the first chunk
+        
+        gzip and bz2 payloads are decompressed as they stream in and zip
+        archives are unpacked after the transfer, so the parsers receive the
+        inner data file directly.
+        
+        Args:
+            url: File URL
+            max_size: Maximum transferred size in bytes (default 10MB)
+            budget: Aggregate allowance shared with other downloads of the same step
+            decompress: Whether to unpack compressed and archived payloads
+            max_decompressed: Maximum size of unpacked content in bytes
+            
+        Returns:
+            Dictionary with 'content', 'file_type' and 'name', or None if failed
+        """
+        charged = 0  # bytes consumed from the budget, given back if the download fails
+        fetched = None
         try:
             logger.info(f"Downloading file from: {url}")
             
-            response = requests.get(url, timeout=30, stream=True)
+            response = requests_session().get(url, timeout=30, stream=True)
             response.raise_for_status()
             
             # Check content length
@@ -46,20 +121,104 @@ class DataProcessor:
                 logger.error(f"File too large: {content_length} bytes")
                 return None
             
+            content_type = response.headers.get('content-type', '')
+            name = url
+            file_type = None
+            decompressor = None
+            received = 0
+            
             # Download with size limit
-            content = b''
-            for chunk in response.iter_content(chunk_size=8192):
-                content += chunk
-                if len(content) > max_size:
+            content = bytearray()
+            chunks = _coalesce_head(response.iter_content(chunk_size=8192), SNIFF_BYTES)
+            for chunk in chunks:
+                received += len(chunk)
+                if received > max_size:
                     logger.error("File exceeded size limit during download")
                     return None
+                if budget is not None:
+                    charged += len(chunk)
+                    if not budget.consume(len(chunk)):
+                        logger.error("Files exceeded aggregate size limit during download")
+                        return None
+                
+                if received == len(chunk):
+                    # Pick the parser from the first chunk, before the transfer finishes
+                    file_type = sniff_content(chunk, url, content_type)
+                    logger.info(f"Sniffed file type: {file_type}")
+                    if decompress and file_type in COMPRESSED_TYPES:
+                        decompressor = StreamDecompressor(file_type, max_decompressed)
+                        name = strip_compression_suffix(urlparse(url).path)
+                        file_type = None  # re-sniffed from the decompressed data
+                
+                if decompressor is not None:
+                    content += decompressor.feed(chunk)
+                    if file_type is None and len(content) >= SNIFF_BYTES:
+                        file_type = sniff_content(content[:SNIFF_BYTES], name)
+                        logger.info(f"Sniffed decompressed file type: {file_type}")
+                else:
+                    content += chunk
+            
+            content = bytes(content)
+            logger.info(f"Downloaded {received} bytes")
+            
+            if decompress and file_type == 'zip':
+                extracted = extract_zip(content, max_decompressed)
+                if extracted is None:
+                    logger.error("Zip archive contains no data files")
+                    return None
+                content, name = extracted
+                file_type = sniff_content(content[:SNIFF_BYTES], name)
             
-            logger.info(f"Downloaded {len(content)} bytes")
-            return content
+            fetched = {
+                "content": content,
+                "file_type": file_type or sniff_content(content[:SNIFF_BYTES], name, content_type),
+                "name": name
+            }
+            return fetched
             
+        except DecompressedSizeError as e:
+            logger.error(f"Error unpacking file: {e}")
+            return None
         except Exception as e:
             logger.error(f"Error downloading file: {e}")
             return None
+        finally:
+            if fetched is None and charged:
+                budget.release(charged)
+    
+    def unpack_payload(self, content: bytes, file_type: str, name: str = '',
+                       max_decompressed: int = 50 * 1024 * 1024) -> Optional[Dict[str, Any]]:
+        """
+        Unpack an in-memory payload (e.g. one embedded in a page) the way fetch_file unpacks downloads
+        
+        Args:
+            content: Payload bytes
+            file_type: Sniffed type of the payload
+            name: URL or file name of the payload
+            max_decompressed: Maximum size of unpacked content in bytes
+            
+        Returns:
+            Dictionary with 'content', 'file_type' and 'name', or None if it cannot be unpacked
+        """
+        try:
+            if file_type in COMPRESSED_TYPES:
+                content = bytes(StreamDecompressor(file_type, max_decompressed).feed(content))
+                name = strip_compression_suffix(urlparse(name).path if '://' in name else name)
+                file_type = sniff_content(content[:SNIFF_BYTES], name)
+            if file_type == 'zip':
+                extracted = extract_zip(content, max_decompressed)
+                if extracted is None:
+                    logger.error("Zip archive contains no data files")
+                    return None
+                content, name = extracted
+                file_type = sniff_content(content[:SNIFF_BYTES], name)
+            return {"content": content, "file_type": file_type, "name": name}
+        except DecompressedSizeError as e:
+            logger.error(f"Error unpacking payload: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error unpacking payload: {e}")
+            return None
     
     def read_pdf(self, content: bytes) -> Optional[str]:
         """
@@ -88,10 +247,29 @@ class DataProcessor:
             logger.error(f"Error reading PDF: {e}")
             return None
     
+    def read_pdf_tables(self, content: bytes) -> List[Dict[str, Any]]:
+        """
+        Extract tables from PDF pages
+        
+        Args:
+            content: PDF file content as bytes
+            
+        Returns:
+            Tables as {'df': DataFrame, 'pages': [page numbers]}, largest first
+        """
+        try:
+            return extract_tables(content, max_pages=Config.PDF_TABLE_MAX_PAGES)
+            
+        except Exception as e:
+            logger.error(f"Error extracting PDF tables: {e}")
+            return []
+    
     def read_csv(self, content: bytes, **kwargs) -> Optional[pd.DataFrame]:
         """
         Read CSV file into DataFrame
         
+        Encoding, delimiter and header row are sniffed unless given in kwargs.
+        
         Args:
             content: CSV file content as bytes
             **kwargs: Additional arguments for pandas.read_csv
@@ -100,7 +278,7 @@ class DataProcessor:
             DataFrame or None
         """
         try:
-            df = pd.read_csv(io.BytesIO(content), **kwargs)
+            df = read_delimited(content, **kwargs)
             logger.info(f"Read CSV: {df.shape[0]} rows, {df.shape[1]} columns")
             return df
             
@@ -108,6 +286,30 @@ class DataProcessor:
             logger.error(f"Error reading CSV: {e}")
             return None
     
+    def read_tsv(self, content: bytes, **kwargs) -> Optional[pd.DataFrame]:
+        """Read tab-separated file into DataFrame"""
+        return self.read_csv(content, sep='\t', **kwargs)
+    
+    def read_parquet(self, content: bytes, **kwargs) -> Optional[pd.DataFrame]:
+        """
+        Read Parquet file into DataFrame
+        
+        Args:
+            content: Parquet file content as bytes
+            **kwargs: Additional arguments for pandas.read_parquet
+            
+        Returns:
+            DataFrame or None
+        """
+        try:
+            df = pd.read_parquet(io.BytesIO(content), **kwargs)
+            logger.info(f"Read Parquet: {df.shape[0]} rows, {df.shape[1]} columns")
+            return df
+            
+        except Exception as e:
+            logger.error(f"Error reading Parquet: {e}")
+            return None
+    
     def read_excel(self, content: bytes, **kwargs) -> Optional[pd.DataFrame]:
         """
         Read Excel file into DataFrame
@@ -178,6 +380,11 @@ class DataProcessor:
         """
         Get basic statistics and info about a DataFrame
         
+        Every column gets a distinct count, its most frequent values and, if
+        numeric, quantiles under 'column_summaries'. From Config.SKETCH_MIN_ROWS
+        rows these come from one streaming pass of approximate sketches and are
+        marked approximate; 'numeric_stats' is always exact.
+        
         Returns:
             Dictionary with analysis results
         """
@@ -203,6 +410,13 @@ class DataProcessor:
                     'sum': float(df[col].sum())
                 }
             
+            if len(df) >= Config.SKETCH_MIN_ROWS:
+                analysis['summary_mode'] = 'sketch'
+                analysis['column_summaries'] = sketch_columns(df, top_k=Config.SKETCH_TOP_K)
+            else:
+                analysis['summary_mode'] = 'exact'
+                analysis['column_summaries'] = exact_columns(df, top_k=Config.SKETCH_TOP_K)
+            
             return analysis
             
         except Exception as e:
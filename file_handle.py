@@ -0,0 +1,157 @@
+"""
+Memory-bounded handles for parsed tables
+
+A parsed table is kept as a compact serialized columnar buffer (Arrow IPC)
+rather than as a DataFrame plus a list-of-dicts copy. Large tables, or tables
+that would push a job past its memory limit, are spilled to Config.TEMP_DIR.
+Rows are materialized only on demand and every handle is released at the end
+of the quiz step that created it.
+"""
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from config import Config
+from parse_pool import deserialize_table, serialize_table
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryLimitExceeded(Exception):
+    """Raised when a job would hold more memory than Config.MAX_JOB_MEMORY"""
+
+
+class JobMemory:
+    """Tracks the bytes a single quiz chain holds in memory, with a hard limit"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def fits(self, amount: int) -> bool:
+        return self.current + amount <= self.limit
+
+    def track(self, amount: int, enforce: bool = False):
+        """
+        Account for bytes now held in memory
+
+        Raises:
+            MemoryLimitExceeded: If enforce is set and the limit would be passed
+        """
+        with self._lock:
+            if enforce and self.current + amount > self.limit:
+                raise MemoryLimitExceeded(
+                    f"Job would hold {self.current + amount} bytes, limit is {self.limit}"
+                )
+            self.current += amount
+            self.peak = max(self.peak, self.current)
+
+    def untrack(self, amount: int):
+        with self._lock:
+            self.current = max(self.current - amount, 0)
+
+    def stats(self) -> Dict[str, int]:
+        return {"current": self.current, "peak": self.peak, "limit": self.limit}
+
+
+class TableHandle:
+    """Serialized table kept in memory or spilled to disk"""
+
+    def __init__(self, payload: bytes, memory: JobMemory, name: str = 'table'):
+        """
+        Args:
+            payload: Table serialized with parse_pool.serialize_table()
+            memory: Accounting for the job that owns the table
+            name: Label used in logs
+        """
+        self.name = name
+        self.memory = memory
+        self.size = len(payload)
+        self._buffer: Optional[bytes] = None
+        self.path: Optional[str] = None
+
+        if self.size > Config.SPILL_THRESHOLD or not memory.fits(self.size):
+            self.path = self._spill(payload)
+            logger.info(f"Spilled {name} ({self.size} bytes) to {self.path}")
+        else:
+            memory.track(self.size)
+            self._buffer = payload
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, memory: JobMemory, name: str = 'table') -> 'TableHandle':
+        return cls(serialize_table(df), memory, name)
+
+    @staticmethod
+    def _spill(payload: bytes) -> str:
+        spill_dir = os.path.join(Config.TEMP_DIR, 'llm-quiz-spill')
+        os.makedirs(spill_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.table', dir=spill_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        return path
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def _read_payload(self) -> bytes:
+        if self._buffer is not None:
+            return self._buffer
+        if self.path is None:
+            raise ValueError(f"{self.name} has been released")
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def load(self) -> pd.DataFrame:
+        """Materialize the full table (not counted against the job's memory)"""
+        return deserialize_table(self._read_payload())
+
+    @contextmanager
+    def materialize(self):
+        """
+        Materialize the table for the duration of a block, counted against the job
+
+        Raises:
+            MemoryLimitExceeded: If the DataFrame would push the job past its limit
+        """
+        df = self.load()
+        nbytes = int(df.memory_usage(deep=True).sum())
+        self.memory.track(nbytes, enforce=True)
+        try:
+            yield df
+        finally:
+            self.memory.untrack(nbytes)
+            del df
+
+    def release(self):
+        """Drop the in-memory buffer and delete any spill file"""
+        if self._buffer is not None:
+            self.memory.untrack(self.size)
+            self._buffer = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.warning(f"Could not remove spill file {self.path}: {e}")
+            self.path = None
+
+    def __repr__(self) -> str:
+        where = 'disk' if self.spilled else 'memory'
+        return f"<TableHandle {self.name} {self.size} bytes in {where}>"
+
+
+def release_file_data(file_data: Optional[Dict[str, Any]]):
+    """Release every table handle held by a process_file(s) result"""
+    if not file_data:
+        return
+    for entry in file_data.get('files', [file_data]):
+        handle = entry.get('table')
+        if isinstance(handle, TableHandle):
+            handle.release()
@@ -0,0 +1,248 @@
+"""
+Content sniffing and on-the-fly decompression for downloaded files
+
+The file type is picked from the magic bytes of the first chunk of a
+download, falling back to the URL suffix and Content-Type header, so
+extension-less URLs and mislabelled files still reach the right parser.
+gzip and bz2 streams are decompressed chunk by chunk as they arrive; zip
+archives are unpacked once the transfer completes.
+"""
+import bz2
+import io
+import logging
+import re
+import zipfile
+import zlib
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Bytes needed to sniff any supported type
+SNIFF_BYTES = 4096
+
+COMPRESSED_TYPES = ('gzip', 'bz2')
+ARCHIVE_TYPES = ('zip',)
+
+_SUFFIX_TYPES = [
+    (('.csv',), 'csv'),
+    (('.tsv', '.tab'), 'tsv'),
+    (('.xlsx', '.xls', '.xlsm'), 'excel'),
+    (('.json', '.geojson'), 'json'),
+    (('.parquet', '.pq'), 'parquet'),
+    (('.pdf',), 'pdf'),
+    (('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'), 'image'),
+    (('.gz', '.gzip'), 'gzip'),
+    (('.bz2',), 'bz2'),
+    (('.zip',), 'zip'),
+]
+
+_CONTENT_TYPES = [
+    ('text/csv', 'csv'),
+    ('text/tab-separated-values', 'tsv'),
+    ('application/json', 'json'),
+    ('application/pdf', 'pdf'),
+    ('spreadsheetml', 'excel'),
+    ('application/vnd.ms-excel', 'excel'),
+    ('image/', 'image'),
+    ('application/gzip', 'gzip'),
+    ('application/x-gzip', 'gzip'),
+    ('application/x-bzip2', 'bz2'),
+    ('application/zip', 'zip'),
+    ('parquet', 'parquet'),
+]
+
+
+class DecompressedSizeError(Exception):
+    """Raised when decompressed data grows past the allowed size"""
+
+
+def type_from_name(name: str) -> str:
+    """File type implied by a URL or archive member name suffix"""
+    path = urlparse(name).path.lower() if '://' in name else name.lower()
+    for suffixes, file_type in _SUFFIX_TYPES:
+        if path.endswith(suffixes):
+            return file_type
+    return 'unknown'
+
+
+def _sniff_text(head: bytes) -> str:
+    """Classify text content as json, tsv or csv"""
+    try:
+        text = head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # The sample may end mid-character; anything else is not UTF-8
+        if e.start < len(head) - 4:
+            text = head.decode('latin-1')
+        else:
+            text = head[:e.start].decode('utf-8')
+
+    if '\x00' in text:
+        return 'unknown'
+    stripped = text.lstrip('\ufeff \t\r\n')
+    if stripped[:1] in ('{', '['):
+        return 'json'
+
+    lines = [line for line in stripped.splitlines()[:10] if line.strip()]
+    if not lines:
+        return 'unknown'
+    tabs = sum(line.count('\t') for line in lines)
+    others = sum(line.count(',') + line.count(';') + line.count('|') for line in lines)
+    if tabs and tabs >= others:
+        return 'tsv'
+    if others:
+        return 'csv'
+    return 'unknown'
+
+
+def sniff_content(head: bytes, name: str = '', content_type: str = '') -> str:
+    """
+    Detect a file type from its first bytes
+
+    Args:
+        head: First bytes of the file (SNIFF_BYTES is enough)
+        name: URL or file name, used when the bytes are inconclusive
+        content_type: Content-Type header, used as a last resort
+
+    Returns:
+        One of pdf, csv, tsv, excel, json, parquet, image, gzip, bz2, zip or unknown
+    """
+    if head.startswith(b'%PDF'):
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04'):
+        # xlsx files are zip archives with a spreadsheet layout
+        if b'[Content_Types].xml' in head or b'xl/' in head:
+            return 'excel'
+        return 'excel' if type_from_name(name) == 'excel' else 'zip'
+    if head.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return 'excel'  # legacy OLE2 .xls
+    if head.startswith(b'\x1f\x8b'):
+        return 'gzip'
+    if head.startswith(b'BZh'):
+        return 'bz2'
+    if head.startswith(b'PAR1'):
+        return 'parquet'
+    if (head.startswith(b'\x89PNG') or head.startswith(b'\xff\xd8\xff')
+            or head.startswith(b'GIF8')
+            or (head[:4] == b'RIFF' and head[8:12] == b'WEBP')):
+        return 'image'
+
+    text_type = _sniff_text(head[:SNIFF_BYTES])
+    if text_type != 'unknown':
+        return text_type
+    by_name = type_from_name(name) if name else 'unknown'
+    if by_name != 'unknown':
+        return by_name
+
+    content_type = (content_type or '').lower()
+    for marker, file_type in _CONTENT_TYPES:
+        if marker in content_type:
+            return file_type
+    return 'unknown'
+
+
+def strip_compression_suffix(name: str) -> str:
+    """data.csv.gz -> data.csv"""
+    return re.sub(r'\.(gz|gzip|bz2)$', '', name, flags=re.IGNORECASE)
+
+
+class StreamDecompressor:
+    """Incrementally decompress gzip or bz2 data with an output size guard"""
+
+    def __init__(self, compression: str, max_output: int):
+        self.compression = compression
+        self.max_output = max_output
+        self.output_size = 0
+        self._decoder = self._new_decoder()
+
+    def _new_decoder(self):
+        if self.compression == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return bz2.BZ2Decompressor()
+
+    def feed(self, chunk: bytes) -> bytes:
+        """
+        Decompress the next chunk of input
+
+        Raises:
+            DecompressedSizeError: If the output exceeds max_output
+        """
+        out = bytearray()
+        data = chunk
+        while True:
+            # Cap each step so a decompression bomb cannot allocate past the guard
+            budget = self.max_output - self.output_size + 1
+            piece = self._decoder.decompress(data, budget)
+            self.output_size += len(piece)
+            if self.output_size > self.max_output:
+                raise DecompressedSizeError(
+                    f"Decompressed data exceeds {self.max_output} bytes"
+                )
+            out += piece
+
+            if self.compression == 'gzip':
+                data = self._decoder.unconsumed_tail
+                if self._decoder.eof:
+                    data = self._decoder.unused_data + data
+                    if not data.strip(b'\x00'):
+                        # Nothing left but trailing padding
+                        break
+                    # Concatenated gzip members
+                    self._decoder = self._new_decoder()
+                elif not data:
+                    break
+            else:
+                data = b''
+                if self._decoder.eof:
+                    data = self._decoder.unused_data
+                    if not data:
+                        break
+                    self._decoder = self._new_decoder()
+                elif self._decoder.needs_input:
+                    break
+                # Otherwise output is still pending for input already consumed
+        return bytes(out)
+
+
+def extract_zip(content: bytes, max_output: int) -> Optional[Tuple[bytes, str]]:
+    """
+    Pull the first data file out of a zip archive
+
+    Members with a recognised data suffix are preferred over anything else;
+    directories and macOS metadata are skipped.
+
+    Returns:
+        (member content, member name) or None if the archive has no usable member
+
+    Raises:
+        DecompressedSizeError: If the member is larger than max_output
+    """
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+            and not info.filename.split('/')[-1].startswith('.')
+        ]
+        if not members:
+            return None
+        members.sort(key=lambda info: type_from_name(info.filename) in ('unknown', 'zip'))
+        member = members[0]
+        if member.file_size > max_output:
+            raise DecompressedSizeError(
+                f"Archive member {member.filename} is {member.file_size} bytes"
+            )
+
+        # file_size comes from the archive and may lie, so count while reading
+        out = bytearray()
+        with archive.open(member) as stream:
+            while True:
+                piece = stream.read(64 * 1024)
+                if not piece:
+                    break
+                out += piece
+                if len(out) > max_output:
+                    raise DecompressedSizeError(
+                        f"Archive member {member.filename} exceeds {max_output} bytes"
+                    )
+        logger.info(f"Extracted {member.filename} ({len(out)} bytes) from zip archive")
+        return bytes(out), member.filename
@@ -0,0 +1,151 @@
+"""
+Incremental parser for JSON objects produced by streamed LLM completions
+"""
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalJSONParser:
+    """
+    Parse a top-level JSON object as it streams in
+
+    Each top-level field is reported as soon as its value is complete, so
+    callers can act on early fields (e.g. file_url) while later ones (e.g.
+    reasoning) are still being generated. Text before the opening brace,
+    such as a markdown code fence, is ignored.
+    """
+
+    def __init__(self, on_field: Optional[Callable[[str, Any], None]] = None):
+        self.on_field = on_field
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expect = 'key'  # 'key', 'colon' or 'value' at depth 1
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Add streamed text
+
+        Args:
+            chunk: Next piece of the completion
+
+        Returns:
+            List of (key, value) pairs completed by this chunk
+        """
+        self.text += chunk
+        completed = []
+        text = self.text
+
+        while self._pos < len(text) and not self.done:
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._end_top_level_string(i, completed)
+                continue
+
+            if self._depth == 0:
+                if ch == '{':
+                    self._depth = 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._string_start = i
+                    if self._expect == 'value':
+                        self._value_start = i
+            elif ch in '{[':
+                if self._depth == 1 and self._expect == 'value':
+                    self._value_start = i
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    self._emit(text[self._value_start:i + 1], completed)
+                elif self._depth == 0:
+                    self._flush_scalar(i, completed)
+                    self.done = True
+            elif self._depth == 1:
+                if ch == ':':
+                    self._expect = 'value'
+                elif ch == ',':
+                    self._flush_scalar(i, completed)
+                    self._expect = 'key'
+                elif self._expect == 'value' and self._value_start is None and not ch.isspace():
+                    # Start of a number, true, false or null
+                    self._value_start = i
+
+        return completed
+
+    def _end_top_level_string(self, end: int, completed: List):
+        raw = self.text[self._string_start:end + 1]
+        if self._expect == 'key':
+            try:
+                self._key = json.loads(raw)
+            except ValueError:
+                self._key = raw.strip('"')
+            self._expect = 'colon'
+        elif self._expect == 'value':
+            self._emit(raw, completed)
+
+    def _flush_scalar(self, end: int, completed: List):
+        if self._value_start is not None and self._key is not None:
+            self._emit(self.text[self._value_start:end].strip(), completed)
+
+    def _emit(self, raw: str, completed: List):
+        key = self._key
+        self._key = None
+        self._value_start = None
+        self._expect = 'after_value'
+        if key is None:
+            return
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            logger.debug(f"Could not parse streamed value for {key}: {raw[:100]}")
+            return
+        self.fields[key] = value
+        completed.append((key, value))
+        if self.on_field:
+            try:
+                self.on_field(key, value)
+            except Exception as e:
+                logger.error(f"Error in streamed field callback for {key}: {e}")
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """
+        Final parsed object
+
+        Falls back to parsing the whole text when the stream was not a
+        well-formed object, and returns whatever fields were completed when the
+        stream was stopped early.
+        """
+        if self.done:
+            return self.fields
+        if not self.fields:
+            try:
+                parsed = json.loads(self.text)
+                if isinstance(parsed, dict):
+                    return parsed
+            except ValueError:
+                return None
+        return self.fields or None
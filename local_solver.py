@@ -0,0 +1,392 @@
+"""
+Answers computed without the LLM
+
+Recognizes a few common question templates (an aggregate of a table column,
+optionally over rows passing a numeric filter, and plain arithmetic) and
+computes them locally. Used as the degraded path while the LLM circuit is
+open, so some answers still get submitted during an outage.
+
+classify_question() recognizes the same templates on a whole quiz page and
+builds the analysis the LLM would return (file and submit URLs, task type,
+and the answer where it needs no file), with a confidence score; confident
+matches skip the analysis call.
+"""
+import ast
+import logging
+import operator
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import numpy as np
+import pandas as pd
+
+from file_sniffer import type_from_name
+from model_router import expected_answer_type
+
+logger = logging.getLogger(__name__)
+
+# Aggregation keywords, checked in order so "average" is not read as a count
+_AGGREGATES = [
+    ('nunique', r'\b(?:distinct|unique)\b'),
+    ('mean', r'\b(?:average|mean)\b'),
+    ('median', r'\bmedian\b'),
+    ('max', r'\b(?:max|maximum|highest|largest|biggest)\b'),
+    ('min', r'\b(?:min|minimum|lowest|smallest)\b'),
+    ('sum', r'\b(?:sum|total|add up|added up)\b'),
+    ('count', r'\b(?:how many|count|number of)\b'),
+]
+
+_COMPARISONS = [
+    ('>=', r'(?:>=|greater than or equal to|at least|not less than)'),
+    ('<=', r'(?:<=|less than or equal to|at most|not more than|not greater than)'),
+    ('>', r'(?:>|greater than|more than|above|over|exceeds?|exceeding|higher than)'),
+    ('<', r'(?:<|less than|below|under|lower than|smaller than)'),
+    ('!=', r'(?:!=|not equal to|other than)'),
+    ('==', r'(?:==|=|equal to|equals|is exactly)'),
+]
+_NUMBER = r'(-?\d[\d,]*(?:\.\d+)?)'
+_CUTOFF = re.compile(r'\bcut-?off\b[^0-9-]{0,20}' + _NUMBER, re.IGNORECASE)
+
+_URL = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+# Relative paths start the text or follow whitespace, a quote or "=", not a tag's "<"
+_RELATIVE_URL = re.compile(r'(?<![^\s"\'(=])/[\w\-./%]*[\w\-%](?:\?[^\s<>"]*)?')
+
+# Template keywords: words a quiz page of that template almost always uses
+_TEMPLATE_KEYWORDS = {
+    'table_aggregate': re.compile(r'\b(?:column|field|rows?|table|records?|entries|values|dataset)\b', re.I),
+    'arithmetic': re.compile(r'\b(?:what is|calculate|compute|evaluate|result of|solve)\b', re.I),
+}
+# Work the templates cannot do; every hit lowers the confidence
+_UNSUPPORTED = re.compile(
+    r'\b(?:chart|plot|graph|visuali[sz]\w*|image|picture|photo|audio|transcri\w*|scrape|scraping|'
+    r'api|headers?|cookie|regex|sentiment|summari[sz]e|translate|explain|base64|data ur[il]|'
+    r'json object|javascript|correlation|regression|predict\w*)\b', re.I
+)
+_TABLE_TYPES = {'csv', 'tsv', 'excel', 'json', 'parquet', 'pdf', 'gzip', 'bz2', 'zip'}
+_SENTENCE = re.compile(r'(?<=[.?!])\s+|\n+')
+
+# Largest integer, in bits, arithmetic on page text may produce
+_MAX_BITS = 4096
+
+_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+    ast.Pow: operator.pow, ast.USub: operator.neg, ast.UAdd: operator.pos,
+}
+
+
+def _plain(value: Any) -> Any:
+    """JSON-friendly answer: integral floats become ints, numpy scalars become Python ones"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def _column_names(col: Any) -> Tuple[str, ...]:
+    name = str(col).lower()
+    return tuple({name, name.replace('_', ' '), name.replace('-', ' ')})
+
+
+def _column_mentions(text: str, df: pd.DataFrame, numeric: bool = False) -> List[Tuple[int, int, Any]]:
+    """
+    Columns named in lowercased text as (start, end, column), in text order
+
+    A name inside a longer one ("id" in "region_id") is not a mention of its own.
+    """
+    columns = [c for c in df.columns if not numeric or pd.api.types.is_numeric_dtype(df[c])]
+    spans = {}
+    for col in columns:
+        for name in _column_names(col):
+            if not name:
+                continue
+            for match in re.finditer(r'(?<![a-z0-9])' + re.escape(name) + r's?(?![a-z0-9])', text):
+                spans.setdefault((match.start(), match.end()), col)
+    mentions = []
+    for (start, end), col in sorted(spans.items(), key=lambda item: (item[0][0], item[0][0] - item[0][1])):
+        if any(s <= start and end <= e for s, e, _ in mentions):
+            continue
+        mentions.append((start, end, col))
+    return mentions
+
+
+def find_column(question: str, df: pd.DataFrame, numeric: bool = False) -> Optional[Any]:
+    """
+    Column named in the question, longest name first
+
+    Falls back to the only (numeric) column when none is named.
+    """
+    mentions = _column_mentions(question.lower(), df, numeric)
+    if mentions:
+        return max(mentions, key=lambda m: m[1] - m[0])[2]
+    columns = [c for c in df.columns if not numeric or pd.api.types.is_numeric_dtype(df[c])]
+    return columns[0] if len(columns) == 1 else None
+
+
+def _aggregate_match(question: str) -> Optional[Tuple[str, int]]:
+    """Aggregate asked for and the position after its keyword"""
+    text = question.lower()
+    for name, pattern in _AGGREGATES:
+        match = re.search(pattern, text)
+        if match:
+            return name, match.end()
+    return None
+
+
+def detect_aggregate(question: str) -> Optional[str]:
+    match = _aggregate_match(question)
+    return match[0] if match else None
+
+
+def _filter_match(question: str, df: pd.DataFrame) -> Optional[Tuple[Optional[Any], str, float, Optional[int]]]:
+    """detect_filter() plus the start of the filter column's mention, if one was named"""
+    text = question.lower()
+    for symbol, pattern in _COMPARISONS:
+        match = re.search(pattern + r'\s*(?:the\s+)?(?:cut-?off\s+(?:of\s+)?)?' + _NUMBER, text)
+        if match:
+            # The filtered column is the one named closest before the comparison
+            before = _column_mentions(text[:match.start()], df, numeric=True)
+            threshold = float(match.group(1).replace(',', ''))
+            if before:
+                start, _, column = before[-1]
+                return column, symbol, threshold, start
+            return None, symbol, threshold, None
+    match = _CUTOFF.search(question)
+    if match:
+        # "values above/below the cutoff" -- default to keeping values at or above it
+        threshold = float(match.group(1).replace(',', ''))
+        symbol = '<' if re.search(r'\b(?:below|under|less)\b', text) else '>='
+        return None, symbol, threshold, None
+    return None
+
+
+def detect_filter(question: str, df: pd.DataFrame) -> Optional[Tuple[Any, str, float]]:
+    """
+    Numeric row filter such as "where value is greater than 50" or "above the cutoff 120"
+
+    Returns:
+        (column, comparison, threshold), with the column None when none is
+        named before the comparison
+    """
+    match = _filter_match(question, df)
+    return match[:3] if match else None
+
+
+def aggregate_column(question: str, df: pd.DataFrame, after: int = 0,
+                     numeric: bool = True, skip: Optional[int] = None) -> Optional[Any]:
+    """
+    Column an aggregate is taken over: the first one named after the aggregate keyword
+
+    Args:
+        question: Question text
+        df: Table the question is about
+        after: Position just past the aggregate keyword
+        numeric: Only consider numeric columns
+        skip: Start of the filter column's mention, which is not the aggregated column
+    """
+    mentions = [m for m in _column_mentions(question.lower(), df, numeric) if m[0] != skip]
+    following = [m for m in mentions if m[0] >= after]
+    if following:
+        return following[0][2]
+    if mentions:
+        return mentions[-1][2]
+    columns = [c for c in df.columns if not numeric or pd.api.types.is_numeric_dtype(df[c])]
+    return columns[0] if len(columns) == 1 else None
+
+
+def answer_from_table(question: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """
+    Compute an aggregate question on a table
+
+    Returns:
+        {'answer', 'explanation'} or None if the question matches no template
+    """
+    matched = _aggregate_match(question)
+    if matched is None:
+        return None
+    aggregate, keyword_end = matched
+
+    rows = df
+    condition = _filter_match(question, df)
+    skip = None
+    if condition is not None:
+        filter_column, symbol, threshold, skip = condition
+        filter_column = filter_column if filter_column is not None else find_column(question, df, numeric=True)
+        if filter_column is None:
+            return None
+        values = pd.to_numeric(df[filter_column], errors='coerce')
+        mask = {
+            '>': values > threshold, '>=': values >= threshold,
+            '<': values < threshold, '<=': values <= threshold,
+            '==': values == threshold, '!=': values != threshold,
+        }[symbol]
+        rows = df[mask.fillna(False).astype(bool)]
+
+    if aggregate == 'count':
+        column = find_column(question, df)
+        answer = int(rows[column].notna().sum()) if column is not None and condition is None else len(rows)
+        return {"answer": answer, "explanation": f"count of {len(rows)} rows"}
+
+    column = aggregate_column(question, df, after=keyword_end, numeric=aggregate != 'nunique', skip=skip)
+    if column is None:
+        return None
+    series = rows[column]
+    if aggregate == 'nunique':
+        answer = int(series.nunique())
+    else:
+        series = pd.to_numeric(series, errors='coerce').dropna()
+        if series.empty:
+            return None
+        answer = getattr(series, aggregate)()
+    explanation = f"{aggregate} of {column}"
+    if condition is not None:
+        explanation += f" over {len(rows)} rows with {condition[1]} {condition[2]:g}"
+    return {"answer": _plain(answer), "explanation": explanation}
+
+
+def _bounded(value: float) -> float:
+    if isinstance(value, int) and value.bit_length() > _MAX_BITS:
+        raise ValueError("value too large")
+    return value
+
+
+def _evaluate(node: ast.AST) -> float:
+    """Evaluate arithmetic, refusing any integer (operand or intermediate) above _MAX_BITS bits"""
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return _bounded(node.value)
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow) and isinstance(left, int) and isinstance(right, int):
+            # Checked before computing: nested powers grow the result exponentially
+            if right > 0 and abs(left) > 1 and (abs(left).bit_length() - 1) * right > _MAX_BITS:
+                raise ValueError("power too large")
+        return _bounded(_OPERATORS[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_evaluate(node.operand))
+    raise ValueError(f"unsupported expression: {ast.dump(node)}")
+
+
+def answer_arithmetic(question: str) -> Optional[Dict[str, Any]]:
+    """Evaluate the arithmetic expression in a question such as "What is 12 * (3 + 4)?" """
+    # URLs and dates are full of digits and separators that look like operators
+    text = re.sub(r'\S+://\S+|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b', ' ', question)
+    candidates = re.findall(r'[\d\s.+\-*/%()^]{3,}', text)
+    for candidate in sorted(candidates, key=len, reverse=True):
+        expression = candidate.strip().replace('^', '**')
+        if not re.search(r'\d\s*(?:\*\*|[+\-*/%])\s*[\d(]', expression):
+            continue
+        try:
+            value = _evaluate(ast.parse(expression, mode='eval'))
+        except (SyntaxError, ValueError, ZeroDivisionError, OverflowError):
+            continue
+        return {"answer": _plain(value), "explanation": f"evaluated {expression}"}
+    return None
+
+
+def _page_links(text: str, base_url: Optional[str]) -> List[str]:
+    """Absolute links of a page in order, with relative paths resolved against base_url"""
+    links = [url.rstrip('.,;:)') for url in _URL.findall(text)]
+    if base_url:
+        stripped = _URL.sub(' ', text)
+        links += [urljoin(base_url, path.rstrip('.,;:)')) for path in _RELATIVE_URL.findall(stripped)]
+    return list(dict.fromkeys(links))
+
+
+def _same_page(url: str, base_url: Optional[str]) -> bool:
+    if not base_url:
+        return False
+    a, b = urlparse(url), urlparse(base_url)
+    return (a.netloc, a.path.rstrip('/')) == (b.netloc, b.path.rstrip('/'))
+
+
+def resolve_links(text: str, base_url: Optional[str] = None) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Links of a quiz page by role
+
+    Returns:
+        (file URLs of a known type, submit URLs, other links except the page itself)
+    """
+    links = _page_links(text, base_url)
+    submit_urls = [url for url in links if 'submit' in urlparse(url).path.lower()]
+    file_urls = [url for url in links if url not in submit_urls and type_from_name(url) != 'unknown']
+    other_links = [url for url in links
+                   if url not in submit_urls and url not in file_urls and not _same_page(url, base_url)]
+    return file_urls, submit_urls, other_links
+
+
+def _arithmetic_in_sentences(text: str) -> Optional[Dict[str, Any]]:
+    """The single arithmetic answer of the sentences that ask for a calculation"""
+    answers = {}
+    for sentence in _SENTENCE.split(text):
+        if _TEMPLATE_KEYWORDS['arithmetic'].search(sentence):
+            local = answer_arithmetic(sentence)
+            if local:
+                answers[repr(local['answer'])] = local
+    return next(iter(answers.values())) if len(answers) == 1 else None
+
+
+def classify_question(text: str, base_url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Match a quiz page against the local templates
+
+    Args:
+        text: Decoded quiz page text
+        base_url: URL of the page, to resolve relative links
+
+    Returns:
+        Analysis dict like the LLM's, plus 'template' and 'confidence' (0-1),
+        or None if the page has no single submit URL or matches no template
+    """
+    file_urls, submit_urls, other_links = resolve_links(text, base_url)
+    if len(submit_urls) != 1:
+        return None
+
+    # Links the templates do not use may hold the data (an API or a page to scrape)
+    penalty = 0.2 * len(_UNSUPPORTED.findall(text)) + 0.15 * len(other_links)
+    analysis = {
+        "file_urls": file_urls,
+        "file_url": file_urls[0] if file_urls else None,
+        "submit_url": submit_urls[0],
+        "answer": None,
+    }
+
+    if file_urls:
+        aggregate = detect_aggregate(text)
+        file_types = {type_from_name(url) for url in file_urls}
+        if aggregate is None or not file_types <= _TABLE_TYPES:
+            return None
+        confidence = 0.5
+        if _TEMPLATE_KEYWORDS['table_aggregate'].search(text):
+            confidence += 0.2
+        if expected_answer_type(text) in ('number', None):
+            confidence += 0.2
+        # "total number of", "sum of the maximum": the wrong aggregate is easy to pick
+        matched = sum(1 for _, pattern in _AGGREGATES if re.search(pattern, text.lower()))
+        confidence -= 0.2 * (matched - 1)
+        analysis.update({
+            "template": "table_aggregate",
+            "task_type": f"{aggregate} of a column in a {'/'.join(sorted(file_types))} table",
+            "reasoning": f"Local template: {aggregate} over the table in {', '.join(file_urls)}"
+        })
+    else:
+        local = _arithmetic_in_sentences(text)
+        if local is None:
+            return None
+        confidence = 0.7
+        if expected_answer_type(text) in ('number', None):
+            confidence += 0.2
+        analysis.update({
+            "template": "arithmetic",
+            "task_type": "arithmetic",
+            "answer": local['answer'],
+            "reasoning": f"Local template: {local['explanation']}"
+        })
+
+    analysis['confidence'] = round(max(0.0, min(1.0, confidence - penalty)), 2)
+    return analysis
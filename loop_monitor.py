@@ -0,0 +1,179 @@
+"""
+Event-loop lag monitoring and blocking-call detection
+
+A task on each monitored loop sleeps for a short interval and measures how
+late it wakes up; the delay is the time the loop spent running callbacks
+that did not yield, e.g. a synchronous HTTP call or DataFrame operation
+inside a coroutine. Lag percentiles and stalls are kept process-wide for
+/health, and every stall above the threshold is logged.
+
+With stack capture on (the default in debug mode) a watchdog thread also
+notices a loop that has not ticked for longer than the threshold and logs
+the loop thread's stack while it is still blocked, which names the call
+responsible.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_STACK_LIMIT = 20
+
+
+class LagStats:
+    """Lag samples and stalls of all monitored loops"""
+
+    def __init__(self, window: int = 2000):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+        self.max_lag = 0.0
+        self.last_stall: Optional[Dict[str, Any]] = None
+
+    def record(self, lag: float, threshold: float):
+        with self._lock:
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > threshold:
+                self.stalls += 1
+                self.stalled_seconds += lag
+
+    def record_stack(self, duration: float, stack: List[str]):
+        with self._lock:
+            self.last_stall = {
+                "at": time.time(),
+                "blocked_ms": round(duration * 1000, 1),
+                "stack": stack
+            }
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            report = {
+                "samples": len(samples),
+                "stalls": self.stalls,
+                "stalled_seconds": round(self.stalled_seconds, 3),
+                "max_lag_ms": round(self.max_lag * 1000, 1),
+                "last_stall": self.last_stall
+            }
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            report[f"lag_{name}_ms"] = round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 1) if samples else None
+        return report
+
+
+class LoopMonitor:
+    """Lag probe running on one event loop"""
+
+    def __init__(self, interval: float, threshold: float, stats: LagStats):
+        self.interval = interval
+        self.threshold = threshold
+        self.stats = stats
+        self.thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self.captured_tick: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self.last_tick = time.monotonic()
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, time.monotonic() - self.last_tick - self.interval)
+                self.stats.record(lag, self.threshold)
+                if lag > self.threshold:
+                    logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+        finally:
+            # Cancelled by stop_loop_monitor() or when asyncio.run() tears the loop down
+            with _lock:
+                if _monitors.get(loop) is self:
+                    del _monitors[loop]
+
+    def blocked_for(self) -> float:
+        """Seconds past the expected wake-up of the probe"""
+        return time.monotonic() - self.last_tick - self.interval
+
+
+_stats = LagStats()
+_monitors: Dict[asyncio.AbstractEventLoop, LoopMonitor] = {}
+_lock = threading.Lock()
+_watchdog: Optional[threading.Thread] = None
+
+
+def _format_stack(frame) -> List[str]:
+    return [line.rstrip() for line in traceback.format_stack(frame, limit=_STACK_LIMIT)]
+
+
+def _watch(threshold: float):
+    """Watchdog thread: log the stack of every loop blocked longer than the threshold"""
+    period = max(threshold / 2, 0.01)
+    while True:
+        time.sleep(period)
+        with _lock:
+            monitors = list(_monitors.values())
+        for monitor in monitors:
+            tick = monitor.last_tick
+            blocked = monitor.blocked_for()
+            if blocked <= monitor.threshold or monitor.captured_tick == tick:
+                continue
+            frame = sys._current_frames().get(monitor.thread_id)
+            if frame is None:
+                continue
+            monitor.captured_tick = tick  # one stack per stall
+            stack = _format_stack(frame)
+            _stats.record_stack(blocked, stack)
+            logger.warning(
+                f"Event loop blocked for {blocked * 1000:.0f}ms so far, loop thread stack:\n"
+                + "\n".join(stack)
+            )
+
+
+def start_loop_monitor() -> Optional[LoopMonitor]:
+    """
+    Monitor the running event loop, once per loop
+
+    Returns:
+        The loop's monitor, or None when monitoring is disabled
+    """
+    global _watchdog
+    if not Config.LOOP_MONITOR_ENABLED:
+        return None
+    loop = asyncio.get_running_loop()
+    with _lock:
+        monitor = _monitors.get(loop)
+        if monitor is not None:
+            return monitor
+        monitor = LoopMonitor(Config.LOOP_MONITOR_INTERVAL_MS / 1000,
+                              Config.LOOP_STALL_THRESHOLD_MS / 1000, _stats)
+        _monitors[loop] = monitor
+        if Config.LOOP_STACK_CAPTURE and _watchdog is None:
+            _watchdog = threading.Thread(target=_watch, args=(monitor.threshold,),
+                                         name="loop-watchdog", daemon=True)
+            _watchdog.start()
+    monitor.task = loop.create_task(monitor.run(), name="loop-monitor")
+    return monitor
+
+
+def stop_loop_monitor():
+    """Stop monitoring the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        monitor = _monitors.pop(loop, None)
+    if monitor is not None and monitor.task is not None:
+        monitor.task.cancel()
+
+
+def loop_stats() -> Dict[str, Any]:
+    """Lag percentiles, stalls and the last captured stack, for /health"""
+    with _lock:
+        loops = len(_monitors)
+    return {"monitored_loops": loops, **_stats.report()}
@@ -0,0 +1,204 @@
+"""
+Model cascade routing: try a fast model first, escalate to stronger ones on failure
+"""
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from utils import is_valid_url
+
+logger = logging.getLogger(__name__)
+
+
+# Phrases that tell us what type of answer the question expects
+_BOOLEAN_HINTS = re.compile(r'\b(true or false|yes or no|true/false|yes/no|boolean)\b', re.I)
+# Only phrases whose answer is a quantity: "the maximum total" or "the minimum count"
+# often qualify a category or name that is the answer
+_NUMBER_HINTS = re.compile(
+    r'\b(how many|how much|number of|sum of|average|mean of|median of|'
+    r'what percentage|ratio of)\b', re.I
+)
+_DATA_URI_HINTS = re.compile(r'\b(base64|data uri|data url)\b', re.I)
+_OBJECT_HINTS = re.compile(r'\bjson object\b', re.I)
+
+# Parts of a quiz page that are not the question: the sample submission payload,
+# URLs and the sentences telling where to post the answer
+_JSON_EXAMPLE = re.compile(r'\{[^{}]*["\':][^{}]*\}')
+_URL = re.compile(r'(?:https?://|/)\S+')
+_SENTENCE_BREAK = re.compile(r'(?<=[.?!])\s+|\n+')
+_SUBMISSION = re.compile(r'\b(post|submit|payload|e-?mail|secret)\b', re.I)
+
+
+def question_sentences(text: str) -> str:
+    """
+    Strip a quiz page down to the sentences that ask the question
+
+    Args:
+        text: Page text, including the submission instructions
+
+    Returns:
+        The question sentences, or the page text without payload examples
+        and URLs if every sentence looks like a submission instruction
+    """
+    previous = None
+    while previous != text:
+        previous, text = text, _JSON_EXAMPLE.sub(' ', text)
+    text = _URL.sub(' ', text)
+    sentences = [s for s in _SENTENCE_BREAK.split(text) if s.strip()]
+    asked = [s for s in sentences if not _SUBMISSION.search(s)]
+    return " ".join(asked or sentences)
+
+
+def expected_answer_type(question: Optional[str]) -> Optional[str]:
+    """
+    Guess the answer type a question asks for
+
+    Only the question sentences are matched, so the sample payload
+    ("answer": 12345) and the posting instructions do not count as hints.
+
+    Returns:
+        'boolean', 'data_uri', 'object', 'number' or None if unclear
+    """
+    if not question:
+        return None
+    question = question_sentences(question)
+    if _BOOLEAN_HINTS.search(question):
+        return 'boolean'
+    if _DATA_URI_HINTS.search(question):
+        return 'data_uri'
+    if _OBJECT_HINTS.search(question):
+        return 'object'
+    if _NUMBER_HINTS.search(question):
+        return 'number'
+    return None
+
+
+def answer_matches_type(answer: Any, expected: Optional[str]) -> bool:
+    """Check an answer against the expected type from expected_answer_type()"""
+    if expected is None:
+        return True
+    if expected == 'boolean':
+        return isinstance(answer, bool) or str(answer).lower() in ('true', 'false', 'yes', 'no')
+    if expected == 'data_uri':
+        return isinstance(answer, str) and answer.startswith('data:')
+    if expected == 'object':
+        return isinstance(answer, (dict, list))
+    if expected == 'number':
+        if isinstance(answer, bool):
+            return False
+        if isinstance(answer, (int, float)):
+            return True
+        try:
+            float(str(answer).replace(',', ''))
+            return True
+        except ValueError:
+            return False
+    return True
+
+
+def validate_analysis(analysis: Optional[Dict], question: Optional[str]) -> Optional[str]:
+    """
+    Check that an analysis can be submitted
+
+    Returns:
+        Reason for rejecting the analysis, or None if it looks usable
+    """
+    if not analysis:
+        return "invalid JSON"
+    submit_url = analysis.get('submit_url')
+    if not submit_url or not is_valid_url(str(submit_url)):
+        return "missing or invalid submit_url"
+    if analysis.get('answer') is None:
+        return "missing answer"
+    expected = expected_answer_type(question)
+    if not answer_matches_type(analysis['answer'], expected):
+        return f"answer type does not match question (expected {expected})"
+    return None
+
+
+class CascadeStats:
+    """Call latency and escalation counters per model tier"""
+
+    def __init__(self):
+        self._tiers: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _tier(self, model: str) -> Dict[str, float]:
+        tier = self._tiers.get(model)
+        if tier is None:
+            tier = {"calls": 0, "failures": 0, "latency_total": 0.0, "escalations": 0}
+            self._tiers[model] = tier
+        return tier
+
+    def record_call(self, model: str, latency: float, ok: bool = True):
+        with self._lock:
+            tier = self._tier(model)
+            tier["calls"] += 1
+            tier["latency_total"] += latency
+            if not ok:
+                tier["failures"] += 1
+
+    def record_escalation(self, model: str):
+        with self._lock:
+            self._tier(model)["escalations"] += 1
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model call counts, average latency and escalation rate"""
+        with self._lock:
+            report = {}
+            for model, tier in self._tiers.items():
+                calls = tier["calls"]
+                report[model] = {
+                    "calls": calls,
+                    "failures": tier["failures"],
+                    "avg_latency": round(tier["latency_total"] / calls, 3) if calls else None,
+                    "escalations": tier["escalations"],
+                    "escalation_rate": round(tier["escalations"] / calls, 3) if calls else None
+                }
+            return report
+
+
+class ModelRouter:
+    """Ordered list of model tiers from fastest to strongest"""
+
+    def __init__(self, models: List[str]):
+        # Drop duplicates while keeping order, e.g. when both tiers are configured the same
+        self.models = list(dict.fromkeys(m for m in models if m))
+        self.stats = CascadeStats()
+
+    def model_for(self, tier: int) -> str:
+        return self.models[min(tier, len(self.models) - 1)]
+
+    def can_escalate(self, tier: int) -> bool:
+        return tier + 1 < len(self.models)
+
+    def escalate(self, tier: int, reason: str, chain_stats: Optional[CascadeStats] = None) -> int:
+        """
+        Move to the next tier
+
+        Returns:
+            The new tier index (unchanged if already at the strongest tier)
+        """
+        if not self.can_escalate(tier):
+            return tier
+        model = self.model_for(tier)
+        self.stats.record_escalation(model)
+        if chain_stats is not None:
+            chain_stats.record_escalation(model)
+        logger.info(f"Escalating from {model} to {self.model_for(tier + 1)}: {reason}")
+        return tier + 1
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Process-wide router so cascade statistics cover every chain"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter([Config.OPENAI_FAST_MODEL, Config.OPENAI_MODEL])
+        return _router
@@ -0,0 +1,200 @@
+"""
+Process pool for CPU-bound file parsing
+
+PDF text extraction, table parsing, JSON decoding and DataFrame analysis
+run in worker processes so a large file cannot stall the event loop that all
+other quiz chains share. Tables come back as Arrow IPC streams when pyarrow is
+installed, which is much cheaper to hand between processes than pickled
+pandas objects.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from config import Config
+from data_processor import DataProcessor
+from rate_limiter import ConcurrencySlots
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# File types whose parsing is worth sending to the pool
+POOL_FILE_TYPES = ('pdf', 'csv', 'tsv', 'excel', 'parquet', 'json')
+
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[ConcurrencySlots] = None
+_lock = threading.Lock()
+
+
+def pool_size() -> int:
+    """Worker count: configured value or the cores available to this process"""
+    if Config.PARSE_POOL_WORKERS > 0:
+        return Config.PARSE_POOL_WORKERS
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def serialize_table(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame as Arrow IPC, falling back to pickle"""
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return b'ARROW' + sink.getvalue().to_pybytes()
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            # Mixed-type object columns cannot be represented in Arrow
+            logger.debug(f"Arrow serialization failed, using pickle: {e}")
+    return b'PICKL' + pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def deserialize_table(payload: bytes) -> pd.DataFrame:
+    """Inverse of serialize_table()"""
+    kind, body = payload[:5], memoryview(payload)[5:]
+    if kind == b'ARROW':
+        return pa.ipc.open_stream(pa.py_buffer(body)).read_all().to_pandas()
+    return pickle.loads(body)
+
+
+def _parse_worker(file_type: str, content: bytes) -> Dict[str, Any]:
+    """Parse file content; runs in a worker process (or a thread for small files)"""
+    processor = DataProcessor()
+
+    if file_type == 'pdf':
+        text = processor.read_pdf(content)
+        result = {'text': text, 'summary': text[:5000] if text else None}
+        # The largest table goes down the same path as a CSV; the others are summarized with it
+        tables = processor.read_pdf_tables(content)
+        if tables:
+            analysis = processor.analyze_dataframe(tables[0]['df'])
+            analysis['pdf_pages'] = tables[0]['pages']
+            if len(tables) > 1:
+                analysis['other_tables'] = [
+                    {
+                        'pdf_pages': t['pages'],
+                        'shape': t['df'].shape,
+                        'columns': t['df'].columns.tolist(),
+                        'rows': t['df'].head(20).to_dict(orient='records'),
+                        'numeric_sums': {c: float(t['df'][c].sum())
+                                         for c in t['df'].select_dtypes('number').columns}
+                    }
+                    for t in tables[1:10]
+                ]
+            result.update(table=serialize_table(tables[0]['df']), analysis=analysis)
+        return result
+
+    readers = {
+        'csv': processor.read_csv,
+        'tsv': processor.read_tsv,
+        'excel': processor.read_excel,
+        'parquet': processor.read_parquet
+    }
+    if file_type in readers:
+        df = readers[file_type](content)
+        if df is None:
+            return {}
+        return {'table': serialize_table(df), 'analysis': processor.analyze_dataframe(df)}
+
+    if file_type == 'json':
+        return {'data': processor.read_json(content)}
+
+    return {}
+
+
+def _get_pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = pool_size()
+            # forkserver avoids forking a process that has live threads and event loops
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(method)
+            if method == 'forkserver':
+                context.set_forkserver_preload(['parse_pool'])
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _slots = ConcurrencySlots(workers + Config.PARSE_QUEUE_SIZE)
+            logger.info(f"Started parse pool with {workers} workers ({method})")
+        return _executor, _slots
+
+
+def shutdown_parse_pool():
+    """Stop the worker processes"""
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+            _slots = None
+
+
+async def warm_parse_pool():
+    """Start every worker process and load its parsers before the first real file"""
+    executor, _ = _get_pool()
+    loop = asyncio.get_running_loop()
+    sample = b'a,b\n1,2\n'
+    try:
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, _parse_worker, 'csv', sample)
+            for _ in range(pool_size())
+        ))
+    except BrokenProcessPool:
+        # Leave a fresh pool to be started by the first real parse
+        shutdown_parse_pool()
+        raise
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Queue depth and saturation of the parse pool"""
+    if _slots is None:
+        return {"started": False, "workers": pool_size()}
+    return {"started": True, "workers": pool_size(), **_slots.stats()}
+
+
+async def parse_file(file_type: str, content: bytes,
+                     deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Parse downloaded content off the event loop
+
+    Args:
+        file_type: Detected file type
+        content: Raw file bytes
+        deadline: time.monotonic() value after which to stop waiting for a pool slot
+
+    Returns:
+        Parsed fields: 'text'/'summary', 'table'/'analysis' or 'data'; 'table'
+        is the serialized table, see file_handle.TableHandle
+    """
+    if file_type not in POOL_FILE_TYPES:
+        return {}
+
+    if len(content) < Config.PARSE_POOL_MIN_BYTES:
+        # Small files cost less to parse than to ship to another process
+        payload = await asyncio.to_thread(_parse_worker, file_type, content)
+    else:
+        executor, slots = _get_pool()
+        # Bounded submission: wait for one of workers + queue size slots
+        async with slots.slot(deadline):
+            loop = asyncio.get_running_loop()
+            try:
+                payload = await loop.run_in_executor(executor, _parse_worker, file_type, content)
+            except BrokenProcessPool:
+                logger.error("Parse pool broke, restarting it and parsing in a thread")
+                shutdown_parse_pool()
+                payload = await asyncio.to_thread(_parse_worker, file_type, content)
+
+    return payload
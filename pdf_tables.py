@@ -0,0 +1,291 @@
+"""
+Table extraction from PDF pages
+
+PyPDF2's plain text output joins the cells of a row with single spaces, so
+column boundaries are lost. Here the text-showing operators of each page are
+collected with their positions instead; fragments are grouped into lines by
+their baseline, split into cells at wide horizontal gaps, and runs of lines
+with a consistent column layout become tables. Tables continued on the next
+page (with or without a repeated header row) are joined, and cells are
+converted to numbers where a column is numeric, so PDF tables can be analyzed
+like CSVs.
+"""
+import io
+import logging
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import PyPDF2
+
+try:
+    # Private API of PyPDF2 (pinned in requirements.txt); without it text is decoded as latin-1
+    from PyPDF2._cmap import build_char_map
+except ImportError:
+    build_char_map = None
+
+from csv_reader import sniff_header
+
+logger = logging.getLogger(__name__)
+
+# Average glyph width as a fraction of the font size, used to estimate where a fragment ends
+_GLYPH_WIDTH = 0.5
+# Horizontal gap, in font sizes, that separates two cells
+_CELL_GAP = 1.0
+# TJ kerning beyond this many thousandths of an em is treated as a cell gap
+_TJ_GAP = 1000
+
+_NUMBER_NOISE = re.compile(r'[\s$€£¥%]|(?<=\d),(?=\d{3}\b)')
+
+
+def _mult(m: List[float], n: List[float]) -> List[float]:
+    return [
+        m[0] * n[0] + m[1] * n[2],
+        m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2],
+        m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4],
+        m[4] * n[1] + m[5] * n[3] + n[5],
+    ]
+
+
+def _decode(operand: Any, charmap: Optional[Tuple]) -> str:
+    """Decode a string operand the way PyPDF2's text extraction does"""
+    if isinstance(operand, str):
+        return operand
+    if charmap is None:
+        return operand.decode('latin-1')
+    encoding, glyphs = charmap[2], charmap[3]
+    if isinstance(encoding, str):
+        try:
+            text = operand.decode(encoding, 'surrogatepass')
+        except Exception:
+            text = operand.decode('utf-16-be' if encoding == 'charmap' else 'charmap', 'surrogatepass')
+    else:
+        text = ''.join(encoding.get(b, chr(b)) for b in operand)
+    return ''.join(glyphs.get(c, c) for c in text)
+
+
+def page_fragments(page) -> List[Dict[str, float]]:
+    """
+    Text fragments of a page with their position
+
+    Returns:
+        Fragments with 'x', 'y' (baseline), 'size' (font size) and 'text'
+    """
+    fonts: Dict[str, Tuple] = {}
+    try:
+        resources = page['/Resources']
+        for name in resources.get('/Font', {}) if build_char_map is not None else ():
+            fonts[name] = build_char_map(name, 200.0, page)
+    except Exception as e:
+        # Also covers a changed build_char_map signature: fonts fall back to latin-1
+        logger.debug(f"No font maps for page: {e}")
+
+    fragments = []
+    state = {'font': None, 'size': 0.0, 'leading': 0.0}
+
+    def add(text: str, x: float, y: float, size: float):
+        if text.strip():
+            fragments.append({'x': x, 'y': y, 'size': size, 'text': text.strip()})
+
+    def visit(operator, operands, cm, tm):
+        if operator == b'Tf':
+            state['font'] = fonts.get(operands[0])
+            state['size'] = float(operands[1])
+        elif operator == b'TL':
+            state['leading'] = float(operands[0])
+        elif operator in (b'Tj', b'TJ', b"'", b'"'):
+            m = _mult(tm, cm)
+            scale = math.hypot(m[2], m[3]) or 1.0
+            size = state['size'] * scale
+            x, y = m[4], m[5]
+            if operator in (b"'", b'"'):
+                y -= state['leading'] * scale  # these move to the next line first
+            if operator != b'TJ':
+                add(_decode(operands[-1], state['font']), x, y, size)
+                return
+            # Split TJ arrays at large negative kerning, which generators use to space out cells
+            text = ''
+            for item in operands[0]:
+                if isinstance(item, (int, float)) or hasattr(item, 'as_numeric'):
+                    shift = float(item)
+                    if shift <= -_TJ_GAP:
+                        add(text, x, y, size)
+                        x += (len(text) * _GLYPH_WIDTH - shift / 1000) * size
+                        text = ''
+                else:
+                    text += _decode(item, state['font'])
+            add(text, x, y, size)
+
+    page.extract_text(visitor_operand_before=visit)
+    return fragments
+
+
+def _lines(fragments: List[Dict[str, float]]) -> List[List[Dict[str, Any]]]:
+    """Group fragments into lines, top to bottom, and lines into cells, left to right"""
+    lines = []
+    for fragment in sorted(fragments, key=lambda f: (-f['y'], f['x'])):
+        tolerance = max(fragment['size'], 1.0) * 0.4
+        if lines and abs(lines[-1][0]['y'] - fragment['y']) <= tolerance:
+            lines[-1].append(fragment)
+        else:
+            lines.append([fragment])
+
+    result = []
+    for line in lines:
+        cells = []
+        for fragment in sorted(line, key=lambda f: f['x']):
+            if cells:
+                cell = cells[-1]
+                gap = fragment['x'] - cell['end']
+                if gap < _CELL_GAP * max(fragment['size'], 1.0):
+                    cell['text'] += ' ' + fragment['text']
+                    cell['end'] = max(cell['end'], fragment['x'] + len(fragment['text']) * _GLYPH_WIDTH * fragment['size'])
+                    continue
+            cells.append({
+                'x': fragment['x'],
+                'end': fragment['x'] + len(fragment['text']) * _GLYPH_WIDTH * fragment['size'],
+                'text': fragment['text']
+            })
+        result.append(cells)
+    return result
+
+
+def _tables_on_page(lines: List[List[Dict[str, Any]]]) -> List[List[List[str]]]:
+    """
+    Runs of consecutive multi-cell lines that share a column layout
+
+    Lines with missing or extra cells are fitted to the columns of the most
+    common layout in their run by nearest cell position.
+    """
+    tables = []
+    run: List[List[Dict[str, Any]]] = []
+    for cells in lines + [[]]:
+        if len(cells) >= 2:
+            run.append(cells)
+            continue
+        if len(run) >= 2:
+            columns, frequency = Counter(len(r) for r in run).most_common(1)[0]
+            if frequency >= 2:
+                full = [r for r in run if len(r) == columns]
+                anchors = [
+                    sorted((r[i]['x'] + r[i]['end']) / 2 for r in full)[len(full) // 2]
+                    for i in range(columns)
+                ]
+                rows = []
+                for r in run:
+                    if len(r) == columns:
+                        rows.append([cell['text'] for cell in r])
+                        continue
+                    row = [''] * columns
+                    for cell in r:
+                        center = (cell['x'] + cell['end']) / 2
+                        i = min(range(columns), key=lambda c: abs(anchors[c] - center))
+                        row[i] = f"{row[i]} {cell['text']}".strip()
+                    rows.append(row)
+                tables.append(rows)
+        run = []
+    return tables
+
+
+def _is_number(cell: str) -> bool:
+    cleaned = _NUMBER_NOISE.sub('', cell.strip()).strip('()')
+    try:
+        float(cleaned)
+        return True
+    except ValueError:
+        return False
+
+
+def _kinds(row: List[str]) -> Tuple[bool, ...]:
+    """Which cells of a row are numbers, to tell data rows from headers"""
+    return tuple(_is_number(cell) for cell in row)
+
+
+def _to_numbers(column: pd.Series) -> pd.Series:
+    """Column as numbers if nearly all its non-empty cells are, else unchanged"""
+    text = column.astype(str).str.strip()
+    filled = text != ''
+    if not filled.any():
+        return column
+    cleaned = text.str.replace(_NUMBER_NOISE, '', regex=True)
+    negative = cleaned.str.match(r'^\(.*\)$')
+    cleaned = cleaned.str.strip('()')
+    numbers = pd.to_numeric(cleaned.where(filled), errors='coerce')
+    if numbers[filled].notna().mean() < 0.9:
+        return column
+    numbers[negative] = -numbers[negative]
+    if numbers.dropna().mod(1).eq(0).all():
+        return numbers.astype('Int64')
+    return numbers
+
+
+def _to_frame(rows: List[List[str]]) -> pd.DataFrame:
+    if sniff_header(rows):
+        header, rows = rows[0], rows[1:]
+        columns, seen = [], Counter()
+        for i, name in enumerate(header):
+            name = name or f"column_{i + 1}"
+            seen[name] += 1
+            columns.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    else:
+        columns = [f"column_{i + 1}" for i in range(len(rows[0]))]
+    df = pd.DataFrame(rows, columns=columns)
+    for col in df.columns:
+        df[col] = _to_numbers(df[col])
+    return df.replace('', None)
+
+
+def extract_tables(content: bytes, max_pages: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Extract the tables of a PDF
+
+    Args:
+        content: PDF file content as bytes
+        max_pages: Only look at this many pages
+
+    Returns:
+        Tables as {'df': DataFrame, 'pages': [page numbers]}, largest first
+    """
+    reader = PyPDF2.PdfReader(io.BytesIO(content))
+    found = []  # (page number, rows)
+    for number, page in enumerate(reader.pages, 1):
+        if max_pages is not None and number > max_pages:
+            break
+        try:
+            for rows in _tables_on_page(_lines(page_fragments(page))):
+                found.append((number, rows))
+        except Exception as e:
+            logger.warning(f"Could not extract tables from PDF page {number}: {e}")
+
+    # Join a table with its continuation on the next page
+    merged: List[Dict[str, Any]] = []
+    for number, rows in found:
+        last = merged[-1] if merged else None
+        if (last is not None and last['pages'][-1] == number - 1
+                and len(last['rows'][0]) == len(rows[0])):
+            if rows[0] == last['rows'][0]:
+                last['rows'].extend(rows[1:])  # repeated header
+                last['pages'].append(number)
+                continue
+            if _kinds(rows[0]) == _kinds(last['rows'][-1]):
+                last['rows'].extend(rows)
+                last['pages'].append(number)
+                continue
+        merged.append({'rows': [list(r) for r in rows], 'pages': [number]})
+
+    tables = []
+    for table in merged:
+        df = _to_frame(table['rows'])
+        # Two aligned columns of words are as likely a two-column text layout as a table
+        if df.shape[1] < 3 and df.select_dtypes('number').empty:
+            continue
+        tables.append({'df': df, 'pages': table['pages']})
+    tables.sort(key=lambda t: t['df'].size, reverse=True)
+    if tables:
+        logger.info(f"Extracted {len(tables)} tables from PDF: "
+                    f"{[t['df'].shape for t in tables]}")
+    return tables
@@ -0,0 +1,243 @@
+"""
+Opt-in profiling of quiz chains
+
+A profiled chain records spans around its stages (page fetch, analysis,
+downloads, parsing, LLM calls, submission) and a background thread samples the
+Python stacks of every thread at a fixed interval. The result is exported to
+Config.TEMP_DIR/profiles as a Chrome trace (open in chrome://tracing, Perfetto
+or speedscope) and as folded stacks for flamegraph.pl.
+
+Only one chain per process is profiled at a time, which bounds the overhead
+when a sample of production traffic is profiled. Stack samples cover the whole
+process, so work of other chains running alongside shows up in them as well.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Leaf functions of threads that are blocked rather than working
+_IDLE_LEAVES = {'select', 'poll', 'wait', '_wait_for_tstate_lock', 'accept', '_worker'}
+_MAX_STACK_DEPTH = 64
+
+_current: ContextVar[Optional['Profiler']] = ContextVar('profiler', default=None)
+_timings: ContextVar[Optional[Dict[str, Dict[str, float]]]] = ContextVar('stage_timings', default=None)
+_active = threading.Lock()
+
+
+def _track_id() -> Tuple[int, str]:
+    """Trace track for the caller: its asyncio task, or its thread outside a loop"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return id(task) & 0x7FFFFFFF, task.get_name()
+    thread = threading.current_thread()
+    return thread.ident & 0x7FFFFFFF, thread.name
+
+
+class Profiler:
+    """Collects spans and stack samples for one quiz chain"""
+
+    def __init__(self, label: str, interval: float):
+        """
+        Args:
+            label: Description stored in the trace metadata
+            interval: Seconds between stack samples
+        """
+        self.label = label
+        self.interval = interval
+        self.trace_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.path: Optional[str] = None
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._spans: List[Dict[str, Any]] = []
+        self._tracks: Dict[int, str] = {}
+        self._frames: Dict[Tuple[str, int], int] = {}
+        self._samples: List[Dict[str, Any]] = []
+        self._folded: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ts(self, t: float) -> float:
+        return round((t - self._origin) * 1e6, 1)
+
+    def add_span(self, name: str, start: float, end: float, args: Dict[str, Any]):
+        tid, track = _track_id()
+        with self._lock:
+            self._tracks.setdefault(tid, track)
+            self._spans.append({
+                "name": name, "cat": "span", "ph": "X", "pid": self._pid, "tid": tid,
+                "ts": self._ts(start), "dur": round((end - start) * 1e6, 1),
+                "args": args
+            })
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _frame_id(self, name: str, parent: int) -> int:
+        key = (name, parent)
+        frame_id = self._frames.get(key)
+        if frame_id is None:
+            frame_id = len(self._frames) + 1
+            self._frames[key] = frame_id
+        return frame_id
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            now = self._ts(time.perf_counter())
+            for ident, frame in sys._current_frames().items():
+                if ident == me or frame.f_code.co_name in _IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < _MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.reverse()
+
+                if ident not in names:
+                    names.update((t.ident, t.name) for t in threading.enumerate())
+                    names.setdefault(ident, str(ident))
+                frame_id = 0
+                for name in stack:
+                    frame_id = self._frame_id(name, frame_id)
+                self._samples.append({
+                    "cpu": 0, "tid": ident & 0x7FFFFFFF, "ts": now, "sf": frame_id,
+                    "weight": 1, "name": names[ident]
+                })
+                self._folded[f"{names[ident]};" + ";".join(stack)] += 1
+
+    def export(self, directory: str) -> str:
+        """
+        Write the trace files
+
+        Returns:
+            Path of the Chrome trace; folded stacks sit next to it with a .folded suffix
+        """
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"quiz-{self.trace_id}")
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self._tracks.items()
+        ]
+        trace = {
+            "traceEvents": metadata + self._spans,
+            "stackFrames": {
+                str(frame_id): {"category": "python", "name": name,
+                                **({"parent": str(parent)} if parent else {})}
+                for (name, parent), frame_id in self._frames.items()
+            },
+            "samples": self._samples,
+            "displayTimeUnit": "ms",
+            "otherData": {"label": self.label, "sample_interval_ms": self.interval * 1000}
+        }
+        with open(base + ".trace.json", 'w') as f:
+            json.dump(trace, f)
+        with open(base + ".folded", 'w') as f:
+            for stack, count in self._folded.items():
+                f.write(f"{stack} {count}\n")
+        self.path = base + ".trace.json"
+        return self.path
+
+
+@contextmanager
+def span(name: str, **args):
+    """
+    Record a span in the active profile and stage timings
+
+    A no-op when the chain is neither profiled nor collecting stage timings.
+    """
+    profiler = _current.get()
+    timings = _timings.get()
+    if profiler is None and timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if profiler is not None:
+            profiler.add_span(name, start, end, args)
+        if timings is not None:
+            stage = timings.setdefault(name, {"seconds": 0.0, "count": 0})
+            stage["seconds"] += end - start
+            stage["count"] += 1
+
+
+@contextmanager
+def stage_timings():
+    """
+    Collect the total time and count of every span in the enclosed block
+
+    Yields a dict of span name -> {"seconds", "count"}; spans of concurrent
+    stages (e.g. parallel downloads) are summed, so totals can exceed wall time.
+    """
+    timings: Dict[str, Dict[str, float]] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def should_profile(requested: bool = False) -> bool:
+    """Explicit request, or a random sample at Config.PROFILE_SAMPLE_RATE"""
+    return requested or (Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE)
+
+
+@asynccontextmanager
+async def profiled(label: str, enabled: bool):
+    """
+    Profile the enclosed block
+
+    Yields the Profiler, or None when profiling is off or another chain in this
+    process is already being profiled. After the block, profiler.path is the
+    exported trace.
+    """
+    if not enabled or not _active.acquire(blocking=False):
+        if enabled:
+            logger.info("Another chain is being profiled, skipping profile")
+        yield None
+        return
+
+    profiler = Profiler(label, Config.PROFILE_INTERVAL_MS / 1000)
+    token = _current.set(profiler)
+    profiler.start()
+    try:
+        with span("solve_quiz", label=label):
+            yield profiler
+    finally:
+        _current.reset(token)
+        profiler.stop()
+        try:
+            path = await asyncio.to_thread(profiler.export, os.path.join(Config.TEMP_DIR, 'profiles'))
+            logger.info(f"Profile written to {path}")
+        except Exception as e:
+            logger.error(f"Could not export profile: {e}")
+        finally:
+            _active.release()
@@ -0,0 +1,270 @@
+"""
+Request handling shared by the Flask (WSGI) and Quart (ASGI) servers
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+from cassette import RECORD, REPLAY_API_KEY, active_cassette, cassette_key, use_cassette
+from config import Config
+from loop_monitor import start_loop_monitor, stop_loop_monitor
+from parse_pool import shutdown_parse_pool
+from profiler import profiled, should_profile
+from quiz_solver import QuizSolver
+from singleflight import SingleFlight
+from state_store import StateStore, get_state_store
+from warmup import readiness, warm_up
+from utils import (
+    is_valid_url,
+    is_valid_email,
+    format_error_response
+)
+
+logger = logging.getLogger(__name__)
+
+# Duplicate (email, url) requests attach to the chain already being solved
+_quiz_flight = SingleFlight("quiz")
+
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+_JOB_POLL_INTERVAL = 0.5
+
+# Process-wide LLM client, only set when running on a long-lived event loop
+_shared_client: Optional[AsyncOpenAI] = None
+
+_warmup_task: Optional[asyncio.Task] = None
+
+
+async def startup(replay: bool = False):
+    """
+    Create process-wide resources; call once the serving event loop is running
+
+    Args:
+        replay: Chains will be served from cassettes, so no API key is needed
+    """
+    global _shared_client, _warmup_task
+    if _shared_client is None:
+        api_key = REPLAY_API_KEY if replay else Config.OPENAI_API_KEY
+        # Retries are driven by the shared rate limiter so they respect the quiz deadline
+        _shared_client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        logger.info("Shared LLM client created")
+    start_loop_monitor()
+    if Config.WARMUP_ENABLED and _warmup_task is None:
+        # Runs in the background so /ready can report the worker as not yet warm
+        _warmup_task = asyncio.create_task(warm_up(_shared_client))
+
+
+async def shutdown():
+    """Release process-wide resources"""
+    global _shared_client, _warmup_task
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+        _warmup_task = None
+    stop_loop_monitor()
+    if _shared_client is not None:
+        await _shared_client.close()
+        _shared_client = None
+        logger.info("Shared LLM client closed")
+    shutdown_parse_pool()
+
+
+async def wait_until_warm():
+    """Wait for the startup warmup, if one is running"""
+    if _warmup_task is not None:
+        await asyncio.shield(_warmup_task)
+
+
+def ready() -> Tuple[bool, Dict[str, Any]]:
+    """Readiness of this worker, see warmup.readiness()"""
+    return readiness(in_flight=_quiz_flight.in_flight())
+
+
+def validate_quiz_payload(data: Optional[Dict]) -> Optional[tuple]:
+    """
+    Validate a /quiz request body
+
+    Returns:
+        Error response tuple, or None if the payload is valid
+    """
+    if not isinstance(data, dict):
+        logger.warning("Invalid request: not a JSON object")
+        return format_error_response("Request must be JSON", 400)
+
+    # Validate required fields
+    email = data.get('email')
+    secret = data.get('secret')
+    quiz_url = data.get('url')
+
+    if not all([email, secret, quiz_url]):
+        logger.warning("Invalid request: missing required fields")
+        return format_error_response(
+            "Missing required fields: email, secret, url",
+            400
+        )
+
+    # Validate email format
+    if not is_valid_email(email):
+        logger.warning(f"Invalid email format: {email}")
+        return format_error_response("Invalid email format", 400)
+
+    # Validate URL format
+    if not is_valid_url(quiz_url):
+        logger.warning(f"Invalid URL format: {quiz_url}")
+        return format_error_response("Invalid URL format", 400)
+
+    # Validate secret
+    if secret != Config.SECRET_KEY:
+        logger.warning(f"Invalid secret for email: {email}")
+        return format_error_response("Invalid secret", 403)
+
+    return None
+
+
+async def solve_quiz_async(email: str, secret: str, quiz_url: str,
+                           profile: bool = False) -> Dict[str, Any]:
+    """
+    Async wrapper for quiz solving
+    
+    Args:
+        profile: Profile this chain; sampled chains are profiled regardless
+    """
+    try:
+        # No-op on the serving loop; covers loops started per request with asyncio.run()
+        start_loop_monitor()
+        recording = nullcontext()
+        if Config.CASSETTE_RECORD and active_cassette() is None:
+            path = os.path.join(Config.TEMP_DIR, 'cassettes',
+                                f"{cassette_key(email, quiz_url)}-{int(time.time())}.cassette.json.gz")
+            recording = use_cassette(path, RECORD, meta={"email": email, "url": quiz_url})
+        with recording as cassette:
+            solver = QuizSolver(client=_shared_client)
+            try:
+                async with profiled(f"{email} {quiz_url}", should_profile(profile)) as profiler:
+                    result = await solver.solve_quiz(email, secret, quiz_url)
+            finally:
+                await solver.close()
+        if profiler is not None and profiler.path:
+            result["profile"] = profiler.path
+        if cassette is not None:
+            result["cassette"] = cassette.path
+        return result
+    except Exception as e:
+        logger.error(f"Error in quiz solver: {e}", exc_info=True)
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Job record written by whichever worker ran the chain"""
+    try:
+        return get_state_store().get_json(f"job:{job_id}")
+    except Exception as e:
+        logger.error(f"Error reading job {job_id}: {e}")
+        return None
+
+
+async def _store_call(fn, *args) -> Any:
+    """Run a state store call off the event loop; store outages are logged, not raised"""
+    try:
+        return await asyncio.to_thread(fn, *args)
+    except Exception as e:
+        logger.error(f"State store error in {fn.__name__}: {e}")
+        return None
+
+
+async def _run_job(store: StateStore, job_id: str, lock_name: str,
+                   email: str, secret: str, quiz_url: str, profile: bool) -> Dict[str, Any]:
+    """Solve the chain as the owner of the shared lock, recording its progress"""
+    job = {
+        "job_id": job_id,
+        "status": "running",
+        "email": email,
+        "url": quiz_url,
+        "worker": _WORKER_ID,
+        "started_at": time.time()
+    }
+    try:
+        await _store_call(store.set_json, f"job:{job_id}", job, Config.JOB_TTL)
+        result = await solve_quiz_async(email, secret, quiz_url, profile)
+        result["job_id"] = job_id
+        job.update(status="done", finished_at=time.time(), result=result)
+        await _store_call(store.set_json, f"job:{job_id}", job, Config.JOB_TTL)
+        return result
+    finally:
+        await _store_call(store.release_lock, lock_name, job_id)
+
+
+async def _wait_for_job(store: StateStore, job_id: str, lock_name: str,
+                        deadline: float) -> Optional[Dict[str, Any]]:
+    """
+    Wait for a chain another worker is solving
+
+    Returns:
+        Its result, or None if the owner gave up the lock without finishing
+    """
+    logger.info(f"Joining job {job_id} running on another worker")
+    while time.monotonic() < deadline:
+        job = await _store_call(store.get_json, f"job:{job_id}")
+        if job and job.get("status") == "done":
+            return job["result"]
+        if await _store_call(store.lock_holder, lock_name) != job_id:
+            # Check once more: the owner may have finished between the two reads
+            job = await _store_call(store.get_json, f"job:{job_id}")
+            return job["result"] if job and job.get("status") == "done" else None
+        await asyncio.sleep(_JOB_POLL_INTERVAL)
+    return None
+
+
+async def _solve_shared(email: str, secret: str, quiz_url: str, profile: bool) -> Dict[str, Any]:
+    """Solve a quiz once across every worker that shares the state store"""
+    store = get_state_store()
+    key = hashlib.sha256(f"{email.lower()}\n{quiz_url}".encode('utf-8')).hexdigest()[:32]
+    lock_name = f"quiz:{key}"
+    deadline = time.monotonic() + Config.QUIZ_TIMEOUT + 10
+
+    while time.monotonic() < deadline:
+        try:
+            job_id = await asyncio.to_thread(store.acquire_lock, lock_name, Config.QUIZ_TIMEOUT + 30)
+        except Exception as e:
+            logger.error(f"State store unavailable, solving without cross-worker dedup: {e}")
+            return await solve_quiz_async(email, secret, quiz_url, profile)
+        if job_id:
+            return await _run_job(store, job_id, lock_name, email, secret, quiz_url, profile)
+
+        holder = await _store_call(store.lock_holder, lock_name)
+        if holder:
+            result = await _wait_for_job(store, holder, lock_name, deadline)
+            if result is not None:
+                return result
+        # The owner went away without a result; try to take the chain over
+        await asyncio.sleep(_JOB_POLL_INTERVAL)
+
+    return {
+        "status": "error",
+        "error": "Timed out waiting for the same quiz on another worker"
+    }
+
+
+async def solve_quiz_coalesced(email: str, secret: str, quiz_url: str,
+                               profile: bool = False) -> Dict[str, Any]:
+    """
+    Solve a quiz, joining an identical in-flight chain here or on another worker
+    
+    Args:
+        profile: Profile the chain if this call ends up running it
+    """
+    flight_key = (email.lower(), quiz_url)
+    return await _quiz_flight.do(flight_key, lambda: _solve_shared(email, secret, quiz_url, profile))
+
+
+def profile_requested(headers) -> bool:
+    """Whether a /quiz request asked to be profiled with the X-Quiz-Profile header"""
+    return headers.get('X-Quiz-Profile', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,176 @@
+"""
+Persistent store of accepted quiz answers
+
+Answers are keyed by quiz URL and a fingerprint of the decoded page content,
+so a page that was solved before is answered again without any LLM call. The
+SQLite database runs in WAL mode so every worker on the same host can share it;
+with a shared state store configured, answers are kept there instead so every
+instance sees them.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+from state_store import StateStore, get_state_store, is_shared
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS solved_quizzes (
+    quiz_url TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    submit_url TEXT NOT NULL,
+    solved_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (quiz_url, fingerprint)
+) WITHOUT ROWID
+"""
+
+
+def content_fingerprint(text: str) -> str:
+    """SHA-256 of the page text with whitespace normalized"""
+    normalized = re.sub(r'\s+', ' ', text or '').strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class QuizStore:
+    """SQLite-backed store of answers the quiz server accepted"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, quiz_url: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a previously accepted answer
+
+        Args:
+            quiz_url: URL of the quiz page
+            fingerprint: content_fingerprint() of the decoded page
+
+        Returns:
+            Dictionary with 'answer' and 'submit_url', or None
+        """
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT answer, submit_url FROM solved_quizzes "
+                "WHERE quiz_url = ? AND fingerprint = ?",
+                (quiz_url, fingerprint)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE solved_quizzes SET hits = hits + 1 "
+                "WHERE quiz_url = ? AND fingerprint = ?",
+                (quiz_url, fingerprint)
+            )
+            conn.commit()
+            return {"answer": json.loads(row[0]), "submit_url": row[1]}
+        except Exception as e:
+            logger.error(f"Error reading quiz store: {e}")
+            return None
+
+    def record(self, quiz_url: str, fingerprint: str, answer: Any, submit_url: str):
+        """Save an answer the server accepted"""
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO solved_quizzes "
+                "(quiz_url, fingerprint, answer, submit_url, solved_at) VALUES (?, ?, ?, ?, ?)",
+                (quiz_url, fingerprint, json.dumps(answer), submit_url, time.time())
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Error writing quiz store: {e}")
+
+    def forget(self, quiz_url: str, fingerprint: str):
+        """Drop an answer the server no longer accepts"""
+        try:
+            conn = self._connection()
+            conn.execute(
+                "DELETE FROM solved_quizzes WHERE quiz_url = ? AND fingerprint = ?",
+                (quiz_url, fingerprint)
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Error deleting from quiz store: {e}")
+
+
+class SharedQuizStore:
+    """Accepted answers kept in the shared state store, same interface as QuizStore"""
+
+    def __init__(self, state: StateStore):
+        self.state = state
+
+    @staticmethod
+    def _key(quiz_url: str, fingerprint: str) -> str:
+        url_hash = hashlib.sha256(quiz_url.encode('utf-8')).hexdigest()[:32]
+        return f"solved:{url_hash}:{fingerprint}"
+
+    def lookup(self, quiz_url: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.state.get_json(self._key(quiz_url, fingerprint))
+        except Exception as e:
+            logger.error(f"Error reading shared quiz store: {e}")
+            return None
+
+    def record(self, quiz_url: str, fingerprint: str, answer: Any, submit_url: str):
+        try:
+            self.state.set_json(self._key(quiz_url, fingerprint),
+                                {"answer": answer, "submit_url": submit_url})
+        except Exception as e:
+            logger.error(f"Error writing shared quiz store: {e}")
+
+    def forget(self, quiz_url: str, fingerprint: str):
+        try:
+            self.state.delete(self._key(quiz_url, fingerprint))
+        except Exception as e:
+            logger.error(f"Error deleting from shared quiz store: {e}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_quiz_store():
+    """Process-wide QuizStore or SharedQuizStore, or None if disabled or unavailable"""
+    global _store
+    if not Config.QUIZ_STORE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            state = get_state_store()
+            if is_shared(state):
+                _store = SharedQuizStore(state)
+                return _store
+            try:
+                _store = QuizStore(Config.QUIZ_STORE_PATH)
+            except Exception as e:
+                logger.error(f"Could not open quiz store at {Config.QUIZ_STORE_PATH}: {e}")
+                return None
+        return _store
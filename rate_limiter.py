@@ -0,0 +1,384 @@
+"""
+Rate limiting and concurrency control for outbound LLM calls and downloads
+
+All primitives here are guarded by threading locks and wait with
+asyncio.sleep, so a single limiter can be shared by every request no matter
+which thread or event loop it runs on.
+"""
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Mapping, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Polling bounds while waiting for a slot or for tokens
+_MIN_POLL = 0.005
+_MAX_POLL = 0.25
+
+
+class RateLimitTimeout(Exception):
+    """Raised when capacity does not free up before the caller's deadline"""
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until a time.monotonic() deadline, or None if unbounded"""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse OpenAI style reset durations such as '1s', '6m0s' or '20ms'
+
+    Returns:
+        Duration in seconds or None if the value cannot be parsed
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value):
+        matched = True
+        amount = float(amount)
+        if unit == 'ms':
+            total += amount / 1000
+        elif unit == 's':
+            total += amount
+        elif unit == 'm':
+            total += amount * 60
+        elif unit == 'h':
+            total += amount * 3600
+    return total if matched else None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """
+        Take tokens from the bucket if available
+
+        Args:
+            amount: Number of tokens to take
+
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they should be
+        """
+        # Requests larger than the bucket would never fit; clamp them so they
+        # wait for a full bucket instead of blocking forever.
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            if self.rate <= 0:
+                return _MAX_POLL
+            return (amount - self.tokens) / self.rate
+
+    def credit(self, amount: float):
+        """Return tokens (positive) or charge extra tokens (negative)"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def clamp(self, level: float):
+        """Lower the bucket to the level reported by the server"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, max(level, 0.0))
+
+    @property
+    def level(self) -> float:
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+
+class ConcurrencySlots:
+    """Bounded number of concurrent holders, awaitable from any event loop"""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self._in_use = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._in_use < self.limit:
+                self._in_use += 1
+                return True
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._in_use <= 0:
+                raise ValueError("ConcurrencySlots released too many times")
+            self._in_use -= 1
+
+    async def acquire(self, deadline: Optional[float] = None):
+        """
+        Wait for a free slot
+
+        Args:
+            deadline: time.monotonic() value after which to give up
+
+        Raises:
+            RateLimitTimeout: If no slot frees up before the deadline
+        """
+        delay = _MIN_POLL
+        with self._lock:
+            self._waiting += 1
+        try:
+            while not self.try_acquire():
+                remaining = _remaining(deadline)
+                if remaining is not None and remaining <= 0:
+                    raise RateLimitTimeout("Timed out waiting for a concurrency slot")
+                wait = delay if remaining is None else min(delay, remaining)
+                await asyncio.sleep(wait)
+                delay = min(delay * 2, _MAX_POLL)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None):
+        """Hold one slot for the duration of the block"""
+        await self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @property
+    def available(self) -> int:
+        return self.limit - self._in_use
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "in_use": self._in_use,
+            "waiting": self._waiting
+        }
+
+
+class Reservation:
+    """Capacity reserved for a single LLM call"""
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+
+
+class LLMRateLimiter:
+    """
+    Combined limiter for chat completion calls
+
+    A call must obtain a global concurrency slot, a per-email slot, one token
+    from the requests-per-minute bucket and its estimated token count from the
+    tokens-per-minute bucket. Rate limit headers and 429 responses adjust the
+    buckets and pause new calls until the server's reset time.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int,
+                 max_concurrency: int, per_email_concurrency: int):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.global_slots = ConcurrencySlots(max_concurrency)
+        self.per_email_concurrency = per_email_concurrency
+        self._email_slots: Dict[str, ConcurrencySlots] = {}
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._consecutive_limited = 0
+        self.rate_limited_count = 0
+
+    def _slots_for(self, email: Optional[str]) -> ConcurrencySlots:
+        key = (email or '').lower()
+        with self._lock:
+            slots = self._email_slots.get(key)
+            if slots is None:
+                slots = ConcurrencySlots(self.per_email_concurrency)
+                self._email_slots[key] = slots
+            return slots
+
+    async def _wait_for_budget(self, estimated_tokens: int, deadline: Optional[float]):
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause <= 0:
+                wait = self.request_bucket.try_acquire(1)
+                if wait <= 0:
+                    wait = self.token_bucket.try_acquire(estimated_tokens)
+                    if wait <= 0:
+                        return
+                    # Give back the request token; both are retaken together
+                    self.request_bucket.credit(1)
+            else:
+                wait = pause
+
+            remaining = _remaining(deadline)
+            if remaining is not None and wait >= remaining:
+                raise RateLimitTimeout(
+                    f"LLM rate limit would delay call by {wait:.1f}s, "
+                    f"only {max(remaining, 0):.1f}s left"
+                )
+            await asyncio.sleep(min(max(wait, _MIN_POLL), 1.0))
+
+    @asynccontextmanager
+    async def reserve(self, email: Optional[str], estimated_tokens: int,
+                      deadline: Optional[float] = None):
+        """
+        Reserve capacity for one LLM call
+
+        Args:
+            email: Tenant the call is made for
+            estimated_tokens: Prompt plus max completion token estimate
+            deadline: time.monotonic() value after which to give up
+
+        Yields:
+            Reservation whose actual_tokens should be set from the response usage
+        """
+        email_slots = self._slots_for(email)
+        async with email_slots.slot(deadline):
+            async with self.global_slots.slot(deadline):
+                await self._wait_for_budget(estimated_tokens, deadline)
+                reservation = Reservation(estimated_tokens)
+                try:
+                    yield reservation
+                finally:
+                    if reservation.actual_tokens is not None:
+                        self.token_bucket.credit(
+                            min(estimated_tokens, self.token_bucket.capacity)
+                            - reservation.actual_tokens
+                        )
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Synchronise buckets with x-ratelimit-* headers of a successful response"""
+        self._consecutive_limited = 0
+        try:
+            remaining_requests = headers.get('x-ratelimit-remaining-requests')
+            remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+            if remaining_requests is not None:
+                self.request_bucket.clamp(float(remaining_requests))
+                if float(remaining_requests) <= 0:
+                    self._pause(parse_reset_duration(headers.get('x-ratelimit-reset-requests')))
+            if remaining_tokens is not None:
+                self.token_bucket.clamp(float(remaining_tokens))
+                if float(remaining_tokens) <= 0:
+                    self._pause(parse_reset_duration(headers.get('x-ratelimit-reset-tokens')))
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Ignoring malformed rate limit headers: {e}")
+
+    def record_rate_limited(self, headers: Optional[Mapping[str, str]] = None) -> float:
+        """
+        Back off after a 429 response
+
+        Returns:
+            Number of seconds new calls are paused for
+        """
+        self.rate_limited_count += 1
+        self._consecutive_limited += 1
+
+        delay = None
+        if headers:
+            retry_after_ms = headers.get('retry-after-ms')
+            if retry_after_ms:
+                delay = parse_reset_duration(retry_after_ms)
+                delay = delay / 1000 if delay is not None else None
+            if delay is None:
+                delay = parse_reset_duration(headers.get('retry-after'))
+            if delay is None:
+                delay = max(
+                    parse_reset_duration(headers.get('x-ratelimit-reset-requests')) or 0,
+                    parse_reset_duration(headers.get('x-ratelimit-reset-tokens')) or 0
+                ) or None
+
+        if delay is None:
+            delay = min(0.5 * (2 ** (self._consecutive_limited - 1)), 20.0)
+        # Jitter spreads out the callers that were all paused at once
+        delay *= random.uniform(1.0, 1.25)
+        self._pause(delay)
+        logger.warning(f"LLM rate limited, pausing new calls for {delay:.2f}s")
+        return delay
+
+    def _pause(self, seconds: Optional[float]):
+        if not seconds:
+            return
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "global": self.global_slots.stats(),
+            "request_tokens": round(self.request_bucket.level, 1),
+            "llm_tokens": round(self.token_bucket.level, 1),
+            "paused_for": round(max(self._paused_until - time.monotonic(), 0.0), 2),
+            "rate_limited": self.rate_limited_count
+        }
+
+
+def estimate_tokens(messages) -> int:
+    """Rough prompt token estimate (~4 characters per token)"""
+    chars = sum(len(m.get('content') or '') for m in messages)
+    return chars // 4 + 4 * len(messages)
+
+
+_llm_limiter: Optional[LLMRateLimiter] = None
+_download_slots: Optional[ConcurrencySlots] = None
+_init_lock = threading.Lock()
+
+
+def get_llm_limiter() -> LLMRateLimiter:
+    """Process-wide limiter shared by all QuizSolver instances"""
+    global _llm_limiter
+    with _init_lock:
+        if _llm_limiter is None:
+            _llm_limiter = LLMRateLimiter(
+                requests_per_minute=Config.LLM_REQUESTS_PER_MINUTE,
+                tokens_per_minute=Config.LLM_TOKENS_PER_MINUTE,
+                max_concurrency=Config.LLM_MAX_CONCURRENCY,
+                per_email_concurrency=Config.LLM_PER_EMAIL_CONCURRENCY
+            )
+        return _llm_limiter
+
+
+def get_download_slots() -> ConcurrencySlots:
+    """Process-wide bound on concurrent file downloads"""
+    global _download_slots
+    with _init_lock:
+        if _download_slots is None:
+            _download_slots = ConcurrencySlots(Config.DOWNLOAD_MAX_CONCURRENCY)
+        return _download_slots
@@ -0,0 +1,94 @@
+"""
+Single-flight coalescing of duplicate in-flight work
+
+Concurrent callers that ask for the same key share one execution: the first
+caller runs the work and every later caller waits for its result. Results are
+shared between callers and should be treated as read-only. If the first caller
+is cancelled, the callers waiting on it run the work again rather than being
+cancelled with it.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into a single execution"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn once for all concurrent callers with the same key
+
+        Args:
+            key: Identity of the work
+            fn: Zero-argument callable returning an awaitable
+
+        Returns:
+            Result of the (possibly shared) execution
+        """
+        while True:
+            with self._lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    # A concurrent.futures.Future can be awaited from any event loop,
+                    # so duplicates coming from other request threads can attach too
+                    future = concurrent.futures.Future()
+                    self._inflight[key] = future
+                    self.executions += 1
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                break
+            logger.info(f"[{self.name}] Joining in-flight work for {key}")
+            try:
+                # Shield so a cancelled follower does not cancel the leader's work
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not future.cancelled() or (task is not None and task.cancelling()):
+                    raise
+                # The leader was cancelled, not this caller: run the work again
+                logger.info(f"[{self.name}] Leader for {key} was cancelled, retrying")
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Followers see a cancelled future and re-run fn instead of failing too
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved to avoid "exception was never retrieved" noise
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    def in_flight(self) -> int:
+        """Number of distinct keys currently executing"""
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,232 @@
+"""
+Bounded-memory column sketches for large tables
+
+Distinct counts (HyperLogLog), quantiles (t-digest) and frequent values
+(Misra-Gries) are updated chunk by chunk with vectorized numpy/pandas
+operations, so a million-row table is summarized in one pass whose memory
+depends on the chunk size and sketch parameters, not on the row count.
+"""
+import logging
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+
+def _scalar(value: Any) -> Any:
+    """Plain Python value for JSON and prompts"""
+    if hasattr(value, 'item'):
+        try:
+            return value.item()
+        except (ValueError, AttributeError):
+            pass
+    return value
+
+
+class HyperLogLog:
+    """Distinct count estimate with about 1.04 / sqrt(2**precision) relative error"""
+
+    def __init__(self, precision: int = 14):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray):
+        """Add values given as uint64 hashes"""
+        if not len(hashes):
+            return
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        rest = (hashes & np.uint64((1 << (64 - self.p)) - 1)).astype(np.float64)  # exact below 2**53
+        # Position of the leftmost 1-bit in the remaining 64 - p bits
+        _, bit_length = np.frexp(rest)
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+class TDigest:
+    """
+    Quantile estimate that is most accurate at the tails
+
+    Merging variant: each batch is sorted together with the current centroids
+    and regrouped so that no centroid spans more than one unit of the k1 scale
+    function, which keeps at most about `compression` centroids.
+    """
+
+    def __init__(self, compression: int = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        total = weights.sum()
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        centers = (np.cumsum(self.weights) - self.weights / 2) / total
+        # Interpolate between centroid centers, anchored at the exact min and max
+        positions = np.r_[0.0, centers, 1.0]
+        values = np.r_[self.min, self.means, self.max]
+        return float(np.interp(q, positions, values))
+
+
+class FrequentValues:
+    """
+    Misra-Gries summary of the most frequent values
+
+    Counts are lower bounds that undercount by at most rows / (capacity + 1),
+    so only values whose count exceeds that bound are reported.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype='int64')
+        self.rows = 0
+
+    def _prune(self, counts: pd.Series) -> pd.Series:
+        if len(counts) <= self.capacity:
+            return counts
+        counts = counts.nlargest(self.capacity + 1, keep='first')
+        counts = counts - counts.iloc[-1]
+        return counts[counts > 0]
+
+    def update(self, values: pd.Series):
+        self.rows += len(values)
+        try:
+            batch = values.value_counts(sort=False)
+        except TypeError:
+            # Unhashable cells such as lists from nested JSON
+            batch = values.astype(str).value_counts(sort=False)
+        # Summaries are mergeable: prune the batch, then the sum of both
+        batch = self._prune(batch)
+        counts = self.counts.add(batch, fill_value=0) if len(self.counts) else batch
+        self.counts = self._prune(counts).astype('int64')
+
+    def top(self, k: int) -> List[List[Any]]:
+        top = self.counts[self.counts > self.max_error].sort_values(ascending=False).head(k)
+        return [[_scalar(value), int(count)] for value, count in top.items()]
+
+    @property
+    def max_error(self) -> int:
+        return self.rows // (self.capacity + 1)
+
+
+def _hashes(values: pd.Series) -> np.ndarray:
+    try:
+        return pd.util.hash_pandas_object(values, index=False).to_numpy(np.uint64)
+    except TypeError:
+        return pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy(np.uint64)
+
+
+def _is_numeric(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def sketch_columns(df: pd.DataFrame, chunk_rows: int = 65536, top_k: int = 10) -> Dict[str, Dict[str, Any]]:
+    """
+    Approximate summary of every column in one pass over row chunks
+
+    Args:
+        df: Table to summarize
+        chunk_rows: Rows processed at a time
+        top_k: Frequent values reported per column
+
+    Returns:
+        Column -> 'distinct' (approximate), 'top_values' ([value, count] pairs
+        with counts as lower bounds, off by at most 'top_count_error'), for
+        numeric columns 'quantiles', and 'approximate': True
+    """
+    sketches = {}
+    for col in df.columns:
+        sketches[col] = {
+            'hll': HyperLogLog(),
+            'top': FrequentValues(max(256, 4 * top_k)),
+            'digest': TDigest() if _is_numeric(df[col]) else None
+        }
+
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        for col, sketch in sketches.items():
+            values = chunk[col].dropna()
+            if not len(values):
+                continue
+            sketch['hll'].update(_hashes(values))
+            sketch['top'].update(values)
+            if sketch['digest'] is not None:
+                sketch['digest'].update(values.to_numpy(dtype=np.float64, na_value=np.nan))
+
+    summaries = {}
+    for col, sketch in sketches.items():
+        summary = {
+            'distinct': sketch['hll'].count(),
+            'top_values': sketch['top'].top(top_k),
+            'top_count_error': sketch['top'].max_error,
+            'approximate': True
+        }
+        if sketch['digest'] is not None:
+            summary['quantiles'] = {f"p{int(q * 100):02d}": sketch['digest'].quantile(q) for q in QUANTILES}
+        summaries[col] = summary
+    return summaries
+
+
+def exact_columns(df: pd.DataFrame, top_k: int = 10) -> Dict[str, Dict[str, Any]]:
+    """Same fields as sketch_columns(), computed exactly for tables small enough to afford it"""
+    summaries = {}
+    for col in df.columns:
+        values = df[col].dropna()
+        try:
+            counts = values.value_counts()
+        except TypeError:
+            values = values.astype(str)
+            counts = values.value_counts()
+        summary = {
+            'distinct': int(len(counts)),
+            'top_values': [[_scalar(value), int(count)] for value, count in counts.head(top_k).items()],
+            'top_count_error': 0,
+            'approximate': False
+        }
+        if _is_numeric(df[col]):
+            quantiles = values.astype(np.float64).quantile(list(QUANTILES)) if len(values) else None
+            summary['quantiles'] = {
+                f"p{int(q * 100):02d}": (float(quantiles[q]) if quantiles is not None else None)
+                for q in QUANTILES
+            }
+        summaries[col] = summary
+    return summaries
@@ -0,0 +1,229 @@
+"""
+Pluggable key-value store for state shared between workers
+
+Job records, the download cache, the solved-quiz answers and cross-process
+locks go through a StateStore. The in-process backend keeps the current
+single-worker behaviour; pointing STATE_STORE_URL at a Redis-protocol server
+(Redis, Valkey, KeyDB, ...) shares that state between every worker and every
+instance, so adding workers raises cache hit rates instead of splitting them.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+from config import Config
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(ABC):
+    """Byte-valued key-value store with expiry and simple locks"""
+
+    backend = "base"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Value of a key, or None if it is missing or expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        """
+        Store a value
+
+        Args:
+            key: Key to set
+            value: Raw bytes
+            ttl: Seconds until the key expires, or None to keep it
+            only_if_absent: Leave an existing key untouched
+
+        Returns:
+            True if the value was written
+        """
+
+    @abstractmethod
+    def delete(self, key: str, only_if_value: Optional[bytes] = None) -> bool:
+        """Delete a key, optionally only while it still holds only_if_value"""
+
+    def get_json(self, key: str) -> Optional[Any]:
+        raw = self.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return self.set(key, json.dumps(value, default=str).encode('utf-8'), ttl)
+
+    def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        """
+        Take a lock that expires after ttl seconds
+
+        Returns:
+            Token to pass to release_lock(), or None if the lock is held
+        """
+        token = uuid.uuid4().hex
+        if self.set(f"lock:{name}", token.encode('ascii'), ttl, only_if_absent=True):
+            return token
+        return None
+
+    def lock_holder(self, name: str) -> Optional[str]:
+        raw = self.get(f"lock:{name}")
+        return raw.decode('ascii') if raw is not None else None
+
+    def release_lock(self, name: str, token: str) -> bool:
+        """Release a lock, unless it expired and somebody else took it"""
+        return self.delete(f"lock:{name}", only_if_value=token.encode('ascii'))
+
+
+class MemoryStore(StateStore):
+    """
+    In-process backend: shared by the threads and event loops of one worker
+
+    Expired keys are swept periodically, and past max_bytes of values the
+    least recently used keys are evicted (locks never are), so a long-lived
+    worker's cache and job records stay bounded.
+    """
+
+    backend = "memory"
+
+    # Seconds between sweeps of expired keys
+    SWEEP_INTERVAL = 30.0
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _remove(self, key: str):
+        self.size -= len(self._data.pop(key)[0])
+
+    def _live(self, key: str) -> Optional[tuple]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            self._remove(key)
+            return None
+        return entry
+
+    def _sweep(self, now: float):
+        self._last_sweep = now
+        for key in [k for k, (_, expires) in self._data.items() if expires is not None and expires <= now]:
+            self._remove(key)
+
+    def _evict(self):
+        if self.max_bytes is None or self.size <= self.max_bytes:
+            return
+        for key in list(self._data):
+            if self.size <= self.max_bytes:
+                break
+            if not key.startswith('lock:'):
+                self._remove(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_sweep >= self.SWEEP_INTERVAL:
+                self._sweep(now)
+            if only_if_absent and self._live(key) is not None:
+                return False
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, now + ttl if ttl is not None else None)
+            self.size += len(value)
+            self._evict()
+            return True
+
+    def delete(self, key: str, only_if_value: Optional[bytes] = None) -> bool:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None or (only_if_value is not None and entry[0] != only_if_value):
+                return False
+            self._remove(key)
+            return True
+
+
+class RedisStore(StateStore):
+    """Backend for any server speaking the Redis protocol"""
+
+    backend = "redis"
+
+    def __init__(self, url: str, prefix: str = 'llmquiz:', client: Optional[Any] = None):
+        """
+        Args:
+            url: Server URL
+            prefix: Prepended to every key
+            client: Connected redis-py compatible client to use instead of url
+        """
+        if redis is None:
+            raise RuntimeError("redis package is required for a redis:// STATE_STORE_URL")
+        self.prefix = prefix
+        self._client = client or redis.Redis.from_url(url, socket_timeout=2.0, socket_connect_timeout=2.0)
+        self._client.ping()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        px = max(int(ttl * 1000), 1) if ttl is not None else None
+        return bool(self._client.set(self.prefix + key, value, px=px, nx=only_if_absent))
+
+    def delete(self, key: str, only_if_value: Optional[bytes] = None) -> bool:
+        key = self.prefix + key
+        if only_if_value is None:
+            return bool(self._client.delete(key))
+        # WATCH/MULTI rather than a Lua script, so servers without scripting work too
+        with self._client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != only_if_value:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.delete(key)
+                return bool(pipe.execute()[0])
+            except redis.WatchError:
+                return False
+
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """Process-wide store selected by STATE_STORE_URL (empty = in-process)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            url = Config.STATE_STORE_URL
+            if url.startswith(('redis://', 'rediss://', 'unix://')):
+                try:
+                    _store = RedisStore(url)
+                    logger.info("Using shared Redis state store")
+                except Exception as e:
+                    # Keep serving with per-process state rather than failing every quiz
+                    logger.error(f"Could not connect to state store, using in-process state: {e}")
+                    _store = MemoryStore(Config.MEMORY_STORE_MAX_BYTES)
+            else:
+                _store = MemoryStore(Config.MEMORY_STORE_MAX_BYTES)
+        return _store
+
+
+def is_shared(store: StateStore) -> bool:
+    """Whether the store is visible to other processes"""
+    return store.backend != "memory"
@@ -0,0 +1,142 @@
+"""
+Answer submission with deadline-bounded retries
+
+Network errors, timeouts, 429 and 5xx responses are retried with jittered
+exponential backoff for as long as the quiz deadline allows, so a transient
+failure costs a short wait instead of another analysis pass. Every attempt
+for one answer carries the same Idempotency-Key header, and a definitive
+response is remembered per chain, so an answer is never graded twice.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from cassette import http_transport
+from config import Config
+from rate_limiter import parse_reset_duration
+
+logger = logging.getLogger(__name__)
+
+_RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Leave no attempt less time than this before the deadline
+_MIN_ATTEMPT_TIME = 1.0
+
+
+def idempotency_key(submit_url: str, payload: Dict[str, Any]) -> str:
+    """Same key for every attempt to submit one answer to one quiz"""
+    answer = json.dumps(payload.get('answer'), sort_keys=True, default=str)
+    material = f"{submit_url}\n{payload.get('email')}\n{payload.get('url')}\n{answer}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:32]
+
+
+class SubmitClient:
+    """Submits the answers of one quiz chain"""
+
+    def __init__(self):
+        # Bound to the active cassette, if any, when the solver is created
+        self._client = httpx.AsyncClient(transport=http_transport(), follow_redirects=True)
+        self._responses: Dict[str, Dict[str, Any]] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.retries = 0
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def submit(self, submit_url: str, payload: Dict[str, Any],
+                     deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Submit an answer, retrying transient failures until the deadline
+
+        Args:
+            submit_url: Endpoint to post to
+            payload: JSON body with email, secret, url and answer
+            deadline: time.monotonic() value after which no attempt is started
+
+        Returns:
+            The server's JSON response, or {"correct": False, "reason": ...};
+            "transient": True marks a failure that was not a verdict on the answer
+        """
+        key = idempotency_key(submit_url, payload)
+        if key in self._responses:
+            logger.info("Answer was already graded, reusing the response")
+            return self._responses[key]
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await self._submit_with_retries(submit_url, payload, key, deadline)
+            if not response.get('transient'):
+                self._responses[key] = response
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here so an unawaited future does not log it
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _submit_with_retries(self, submit_url: str, payload: Dict[str, Any], key: str,
+                                   deadline: Optional[float]) -> Dict[str, Any]:
+        if deadline is None:
+            deadline = time.monotonic() + Config.SUBMIT_TIMEOUT
+        headers = {'Content-Type': 'application/json', 'Idempotency-Key': key}
+        attempt = 0
+        reason = "Submission deadline passed"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining < _MIN_ATTEMPT_TIME:
+                break
+            attempt += 1
+            retry_after = None
+            try:
+                response = await self._client.post(
+                    submit_url, json=payload, headers=headers,
+                    timeout=min(Config.SUBMIT_TIMEOUT, remaining)
+                )
+                if response.status_code not in _RETRY_STATUS:
+                    return self._parse(response)
+                reason = f"HTTP {response.status_code}"
+                retry_after = parse_reset_duration(response.headers.get('retry-after'))
+            except httpx.TransportError as e:
+                # Connection errors, resets and timeouts
+                reason = f"{type(e).__name__}: {e}"
+
+            if attempt >= Config.SUBMIT_MAX_ATTEMPTS:
+                break
+            delay = retry_after if retry_after is not None else random.uniform(
+                0, min(Config.SUBMIT_BACKOFF_MAX, Config.SUBMIT_BACKOFF_BASE * 2 ** (attempt - 1))
+            )
+            if time.monotonic() + delay > deadline - _MIN_ATTEMPT_TIME:
+                break
+            self.retries += 1
+            logger.warning(f"Submission attempt {attempt} failed ({reason}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+        logger.error(f"Submission failed after {attempt} attempts: {reason}")
+        return {"correct": False, "reason": reason, "transient": True}
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> Dict[str, Any]:
+        """Definitive response; 4xx bodies often carry the reason as JSON"""
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if response.is_success and isinstance(data, dict):
+            return data
+        if isinstance(data, dict):
+            return {"correct": False, **data, "status_code": response.status_code}
+        return {
+            "correct": False,
+            "reason": f"HTTP {response.status_code}: {response.text[:200]}",
+            "status_code": response.status_code
+        }
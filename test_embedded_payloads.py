@@ -0,0 +1,41 @@
+"""
+Unit tests for decoding base64 payloads embedded in quiz pages
+"""
+import base64
+import gzip
+
+from utils import extract_embedded_payloads
+
+
+def _atob_page(data: bytes) -> str:
+    encoded = base64.b64encode(data).decode('ascii')
+    return f"<div id=q></div><script>q.innerHTML = atob(`{encoded[:40]}\n{encoded[40:]}`);</script>"
+
+
+def test_atob_instructions_with_commas_are_page_text():
+    instructions = (
+        b"Download the file, sum the value column, and round the result to 2 places.\n"
+        b"Skip rows where price, tax, or region is missing.\n"
+        b"Post it to https://example.com/submit with your email, secret, and the quiz url.\n"
+    )
+    [payload] = extract_embedded_payloads(_atob_page(instructions))
+    assert payload['file_type'] == 'text'
+    assert payload['data'] == instructions
+
+
+def test_atob_json_instructions_are_page_text():
+    instructions = b'{"question": "What is the sum of the value column?",\n "submit": "https://example.com/submit"}'
+    [payload] = extract_embedded_payloads(_atob_page(instructions))
+    assert payload['file_type'] == 'text'
+
+
+def test_atob_binary_payload_is_a_file():
+    [payload] = extract_embedded_payloads(_atob_page(gzip.compress(b"a,b\n1,2\n")))
+    assert payload['file_type'] == 'gzip'
+
+
+def test_data_uri_csv_is_a_file():
+    encoded = base64.b64encode(b"a,b\n1,2\n3,4\n").decode('ascii')
+    [payload] = extract_embedded_payloads(f"<a href='data:text/csv;base64,{encoded}'>data</a>")
+    assert payload['file_type'] == 'csv'
+    assert payload['source'] == 'data_uri'
@@ -0,0 +1,102 @@
+"""
+Unit tests for the local question templates
+"""
+import pandas as pd
+
+from local_solver import (
+    aggregate_column,
+    answer_arithmetic,
+    answer_from_table,
+    detect_aggregate,
+    detect_filter,
+    find_column,
+)
+from model_router import expected_answer_type
+
+
+def _frame():
+    return pd.DataFrame({
+        'value': [10, 20, 30, 40],
+        'price': [40, 60, 70, 10],
+        'amount': [1, 2, 3, 4],
+        'region_id': [1, 3, 5, 2],
+        'name': ['a', 'b', 'c', 'a'],
+    })
+
+
+def test_filter_column_is_named_closest_before_comparison():
+    question = "What is the sum of the value column where price is greater than 50?"
+    assert detect_filter(question, _frame()) == ('price', '>', 50.0)
+
+
+def test_filter_without_named_column():
+    assert detect_filter("Sum the values above 25", _frame().drop(columns='value'))[1:] == ('>', 25.0)
+
+
+def test_filter_cutoff():
+    assert detect_filter("Add up everything below the cutoff 35", _frame()) == (None, '<', 35.0)
+
+
+def test_aggregate_column_is_named_after_keyword():
+    question = "Sum the amount for rows where region_id is at least 3"
+    assert aggregate_column(question, _frame(), after=3) == 'amount'
+
+
+def test_sum_with_filter_on_other_column():
+    result = answer_from_table("What is the sum of the value column where price is greater than 50?", _frame())
+    assert result['answer'] == 50
+
+
+def test_sum_with_filter_on_longer_named_column():
+    result = answer_from_table("Sum the amount for rows where region_id is at least 3", _frame())
+    assert result['answer'] == 5
+    assert result['explanation'].startswith('sum of amount')
+
+
+def test_filter_on_aggregated_column():
+    assert answer_from_table("What is the sum of price where price is above 50?", _frame())['answer'] == 130
+
+
+def test_count_with_filter():
+    assert answer_from_table("How many rows have price greater than 30?", _frame())['answer'] == 3
+
+
+def test_distinct_values():
+    assert answer_from_table("How many distinct name values are there?", _frame())['answer'] == 3
+
+
+def test_name_inside_longer_name_is_not_a_mention():
+    df = pd.DataFrame({'id': [1, 2], 'region_id': [3, 4]})
+    assert find_column("What is the max region_id?", df) == 'region_id'
+
+
+def test_no_template():
+    assert detect_aggregate("Which city is the capital of France?") is None
+    assert answer_from_table("Which city is the capital of France?", _frame()) is None
+
+
+def test_arithmetic():
+    assert answer_arithmetic("What is 12 * (3 + 4)?")['answer'] == 84
+    assert answer_arithmetic("What is 2 ^ 10 - 24?")['answer'] == 1000
+
+
+def test_arithmetic_refuses_huge_powers():
+    assert answer_arithmetic("What is ((9**99)**99)**99?") is None
+    assert answer_arithmetic("What is (((9**99)**99)**99)**99?") is None
+    assert answer_arithmetic("What is 2**5000 * 2**5000?") is None
+
+
+def test_answer_type_ignores_payload_example():
+    page = (
+        "Which city is the capital of France?\n"
+        "Post your answer to https://example.com/submit with this JSON payload:\n"
+        '{"email": "your email", "secret": "your secret", "answer": 12345}'
+    )
+    assert expected_answer_type(page) is None
+    assert expected_answer_type(page.replace("Which city", "How many cities")) == 'number'
+
+
+def test_superlative_naming_question_does_not_expect_number():
+    assert expected_answer_type("Which category has the maximum total?") is None
+    assert expected_answer_type("Name the region with the minimum count.") is None
+    assert expected_answer_type("What is the sum of the value column?") == 'number'
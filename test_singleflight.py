@@ -0,0 +1,82 @@
+"""
+Unit tests for single-flight coalescing
+"""
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["done"] * 3
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 2}
+
+
+def test_follower_gets_result_when_leader_is_cancelled():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "done"
+    assert len(calls) == 2
+    assert flight.in_flight() == 0
+
+
+def test_cancelled_follower_does_not_cancel_leader():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_errors_are_shared():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(flight.do("k", work), flight.do("k", work), return_exceptions=True)
+
+    assert [type(r) for r in asyncio.run(main())] == [ValueError, ValueError]
@@ -0,0 +1,104 @@
+"""
+Unit tests for the state store backends
+
+The Redis backend runs against fakeredis, an in-process stand-in for a
+Redis server.
+"""
+import time
+
+import pytest
+
+from state_store import MemoryStore, RedisStore, StateStore
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return MemoryStore()
+    return RedisStore("redis://stand-in", client=fakeredis.FakeRedis())
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        StateStore()
+
+
+def test_get_set_delete(store):
+    assert store.get("a") is None
+    assert store.set("a", b"1")
+    assert store.get("a") == b"1"
+    assert store.delete("a")
+    assert store.get("a") is None
+    assert not store.delete("a")
+
+
+def test_only_if_absent(store):
+    assert store.set("a", b"1", only_if_absent=True)
+    assert not store.set("a", b"2", only_if_absent=True)
+    assert store.get("a") == b"1"
+
+
+def test_ttl(store):
+    store.set("a", b"1", ttl=0.05)
+    assert store.get("a") == b"1"
+    time.sleep(0.1)
+    assert store.get("a") is None
+    assert store.set("a", b"2", only_if_absent=True)
+
+
+def test_delete_only_if_value(store):
+    store.set("a", b"1")
+    assert not store.delete("a", only_if_value=b"2")
+    assert store.delete("a", only_if_value=b"1")
+
+
+def test_json(store):
+    store.set_json("job", {"status": "running", "steps": [1, 2]})
+    assert store.get_json("job") == {"status": "running", "steps": [1, 2]}
+
+
+def test_locks(store):
+    token = store.acquire_lock("chain", ttl=5)
+    assert token is not None
+    assert store.acquire_lock("chain", ttl=5) is None
+    assert store.lock_holder("chain") == token
+    assert not store.release_lock("chain", "other")
+    assert store.release_lock("chain", token)
+    assert store.acquire_lock("chain", ttl=5) is not None
+
+
+def test_redis_keys_are_prefixed():
+    client = fakeredis.FakeRedis()
+    RedisStore("redis://stand-in", prefix="p:", client=client).set("a", b"1")
+    assert client.get("p:a") == b"1"
+
+
+def test_memory_evicts_least_recently_used():
+    store = MemoryStore(max_bytes=10)
+    store.set("a", b"1234")
+    store.set("b", b"1234")
+    store.get("a")
+    store.set("c", b"1234")
+    assert store.get("b") is None
+    assert store.get("a") == b"1234"
+    assert store.get("c") == b"1234"
+    assert store.size == 8
+
+
+def test_memory_never_evicts_locks():
+    store = MemoryStore(max_bytes=4)
+    token = store.acquire_lock("chain", ttl=5)
+    store.set("a", b"12345678")
+    assert store.lock_holder("chain") == token
+
+
+def test_memory_sweeps_expired_keys():
+    store = MemoryStore()
+    store.SWEEP_INTERVAL = 0
+    store.set("a", b"1234", ttl=0.01)
+    time.sleep(0.02)
+    store.set("b", b"1")
+    assert "a" not in store._data
+    assert store.size == 1
@@ -0,0 +1,194 @@
+"""
+LLM token accounting and adaptive completion limits
+
+Every LLM call records its prompt and completion tokens under its call site
+(analyze, compute, ...), model and task type. The completion lengths seen per
+call site feed back into max_tokens: once enough calls have been observed, the
+limit shrinks to a high percentile of real completions plus headroom, so a
+runaway generation is cut off long before the static ceiling. A truncation
+sends the call site back to its static ceiling until a full window of calls
+has passed without one.
+"""
+import logging
+import math
+import re
+import threading
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# USD per million (prompt, completion) tokens; Config.LLM_PRICES overrides by model prefix
+DEFAULT_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4-turbo': (10.00, 30.00),
+    'gpt-4': (30.00, 60.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+}
+
+_WINDOW = 200
+
+
+# Task types are free text written by the LLM; the ledger keys on these fixed categories
+# instead, first match wins, so its size stays bounded
+_TASK_CATEGORIES = [
+    ('visualization', r'chart|plot|graph|visuali[sz]'),
+    ('image', r'image|picture|photo|png|jpe?g'),
+    ('audio', r'audio|transcri|speech'),
+    ('scrape', r'scrap|web ?page|website|html|crawl'),
+    ('api', r'\bapi\b|endpoint|header'),
+    ('join', r'join|merge'),
+    ('aggregate', r'sum|total|count|average|mean|median|max|min|aggregat|group'),
+    ('filter', r'filter|where|select'),
+    ('arithmetic', r'arithmetic|calculat|comput'),
+    ('text', r'text|string|word|sentiment|extract'),
+]
+
+
+def task_category(task_type: Optional[str]) -> str:
+    """Fixed category of a free-text task type"""
+    if not task_type or not isinstance(task_type, str):
+        return 'unknown'
+    text = task_type.lower()
+    for category, pattern in _TASK_CATEGORIES:
+        if re.search(pattern, text):
+            return category
+    return 'other'
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Cost of a call in USD, or None for a model without a known price"""
+    prices = {**DEFAULT_PRICES, **{k: tuple(v) for k, v in Config.LLM_PRICES.items()}}
+    # Longest prefix wins so gpt-4o-mini is not priced as gpt-4o
+    for name in sorted(prices, key=len, reverse=True):
+        if model.startswith(name):
+            prompt_price, completion_price = prices[name]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+    return None
+
+
+class UsageTotals:
+    """Token and cost totals, grouped by key"""
+
+    def __init__(self):
+        self._totals: Dict[Tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Tuple, prompt_tokens: int, completion_tokens: int,
+            cost: Optional[float], truncated: bool = False):
+        with self._lock:
+            entry = self._totals.setdefault(key, {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "cost_usd": 0.0, "truncated": 0
+            })
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["cost_usd"] += cost or 0.0
+            entry["truncated"] += int(truncated)
+
+    def total(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self._totals.values())
+        return {
+            "calls": sum(e["calls"] for e in entries),
+            "prompt_tokens": sum(e["prompt_tokens"] for e in entries),
+            "completion_tokens": sum(e["completion_tokens"] for e in entries),
+            "cost_usd": round(sum(e["cost_usd"] for e in entries), 6)
+        }
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                "/".join(key): {**entry, "cost_usd": round(entry["cost_usd"], 6)}
+                for key, entry in self._totals.items()
+            }
+
+
+class TokenLedger:
+    """Process-wide usage per (call site, model, task type) and adaptive max_tokens"""
+
+    def __init__(self, min_samples: int, percentile: float, headroom: float, floor: int):
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.headroom = headroom
+        self.floor = floor
+        self.usage = UsageTotals()
+        # (call_site, model) -> last _WINDOW (completion_tokens, truncated)
+        self._lengths: Dict[Tuple[str, str], deque] = defaultdict(lambda: deque(maxlen=_WINDOW))
+        self._lock = threading.Lock()
+
+    def record(self, call_site: str, model: str, task_type: Optional[str],
+               prompt_tokens: int, completion_tokens: int,
+               truncated: bool = False) -> Optional[float]:
+        """
+        Record one call
+
+        Returns:
+            Cost of the call in USD, or None if the model has no known price
+        """
+        cost = call_cost(model, prompt_tokens, completion_tokens)
+        self.usage.add((call_site, model, task_category(task_type)),
+                       prompt_tokens, completion_tokens, cost, truncated)
+        with self._lock:
+            self._lengths[(call_site, model)].append((completion_tokens, truncated))
+        return cost
+
+    def max_tokens_for(self, call_site: str, model: str, ceiling: int) -> int:
+        """
+        Completion limit for the next call
+
+        Args:
+            call_site: Name of the calling code path
+            model: Model about to be called
+            ceiling: Static limit of the call site, used until enough calls were seen
+
+        Returns:
+            Adapted limit between the floor and ceiling
+        """
+        if not Config.ADAPTIVE_MAX_TOKENS:
+            return ceiling
+        with self._lock:
+            window = list(self._lengths.get((call_site, model), ()))
+        if len(window) < self.min_samples or any(truncated for _, truncated in window):
+            return ceiling
+
+        lengths = sorted(length for length, _ in window)
+        index = min(len(lengths) - 1, math.ceil(self.percentile * len(lengths)) - 1)
+        limit = int(lengths[index] * self.headroom) + 16
+        return max(self.floor, min(ceiling, limit))
+
+    def limits(self) -> Dict[str, int]:
+        """Sample counts per (call site, model), for monitoring"""
+        with self._lock:
+            return {f"{site}/{model}": len(window) for (site, model), window in self._lengths.items()}
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "total": self.usage.total(),
+            "by_call_site": self.usage.report(),
+            "samples": self.limits()
+        }
+
+
+_ledger: Optional[TokenLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_token_ledger() -> TokenLedger:
+    """Process-wide ledger shared by all QuizSolver instances"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = TokenLedger(
+                min_samples=Config.ADAPTIVE_MAX_TOKENS_MIN_SAMPLES,
+                percentile=0.95,
+                headroom=1.5,
+                floor=Config.ADAPTIVE_MAX_TOKENS_FLOOR
+            )
+        return _ledger
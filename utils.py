@@ -2,13 +2,17 @@
 Utility functions for the LLM Analysis Quiz application
 """
 import base64
+import binascii
 import io
 import json
 import logging
 import re
-from typing import Any, Dict, Optional
+from collections import Counter
+from typing import Any, Dict, List, Optional
 from urllib.parse import urlparse
 
+from file_sniffer import SNIFF_BYTES, sniff_content
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,44 +37,112 @@ def is_valid_email(email: str) -> bool:
     return re.match(pattern, email) is not None
 
 
-def extract_base64_from_html(html: str) -> Optional[str]:
-    """Extract base64 content from HTML atob() calls"""
+_ATOB_PAYLOAD = re.compile(rb'atob\(\s*[`\'"]([A-Za-z0-9+/=_\-\s]+)[`\'"]\s*\)')
+_DATA_URI_PAYLOAD = re.compile(rb'data:([\w.+-]+/[\w.+-]+)?(?:;[\w-]+=[^;,"\'\s]*)*;base64,([A-Za-z0-9+/=_\-]+)')
+_URLSAFE_CHARS = re.compile(rb'[-_]')
+_NOT_BASE64 = re.compile(rb'[^A-Za-z0-9+/_-]')
+_URLSAFE_TO_STANDARD = bytes.maketrans(b'-_', b'+/')
+
+
+def _b64decode(view: memoryview, urlsafe: bool) -> Optional[bytes]:
+    """Decode base64 from a slice of the page without copying it first"""
+    if not urlsafe:
+        try:
+            # Whitespace and line breaks inside the payload are skipped by the decoder
+            return binascii.a2b_base64(view)
+        except binascii.Error:
+            pass
+    # URL-safe alphabet or missing padding: these need a cleaned copy
+    cleaned = _NOT_BASE64.sub(b'', view).translate(_URLSAFE_TO_STANDARD)
+    cleaned += b'=' * (-len(cleaned) % 4)
     try:
-        # Look for atob(`...`) pattern
-        pattern = r'atob\([`\'"]([A-Za-z0-9+/=\s]+)[`\'"]\)'
-        matches = re.findall(pattern, html)
-        
-        if matches:
-            # Return the first match, cleaned
-            return matches[0].replace('\n', '').replace(' ', '')
-        
-        # Also check for direct base64 strings
-        pattern2 = r'data:([^;]+);base64,([A-Za-z0-9+/=]+)'
-        matches2 = re.findall(pattern2, html)
-        
-        if matches2:
-            return matches2[0][1]
-            
-        return None
-    except Exception as e:
-        logger.error(f"Error extracting base64: {e}")
+        return binascii.a2b_base64(cleaned)
+    except binascii.Error:
         return None
 
 
-def decode_base64(encoded: str) -> Optional[str]:
-    """Decode base64 string to text"""
+def _is_structured(data: bytes, file_type: str) -> bool:
+    """Whether text sniffed as json/csv/tsv really is data rather than prose with commas"""
     try:
-        # Clean the string
-        encoded = encoded.strip().replace('\n', '').replace(' ', '')
-        
-        # Decode
-        decoded_bytes = base64.b64decode(encoded)
-        decoded_str = decoded_bytes.decode('utf-8')
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return True
+    if file_type == 'json':
+        try:
+            json.loads(text)
+            return True
+        except ValueError:
+            return False
+    lines = [line for line in text.splitlines()[:20] if line.strip()]
+    if len(lines) < 2:
+        return False
+    delimiter = '\t' if file_type == 'tsv' else max(',;|', key=lambda d: lines[0].count(d))
+    counts = Counter(line.count(delimiter) for line in lines)
+    columns, frequency = counts.most_common(1)[0]
+    return columns > 0 and frequency >= 0.8 * len(lines)
+
+
+def _payload_type(data: bytes, mime: str, source: str) -> str:
+    """File type of a payload from its magic bytes or declared MIME type; 'text' for page text"""
+    file_type = sniff_content(data[:SNIFF_BYTES], content_type=mime)
+    if source == 'atob' and file_type in ('csv', 'tsv', 'json'):
+        # Scripts mostly decode the instructions themselves, which may be JSON or
+        # comma-heavy prose; only magic bytes make a script payload a file
+        return 'text'
+    if mime.startswith(('text/html', 'text/plain')):
+        return 'text' if file_type in ('csv', 'tsv', 'json', 'unknown') else file_type
+    if file_type in ('csv', 'tsv', 'json'):
+        declared = sniff_content(b'', content_type=mime) if mime else 'unknown'
+        return file_type if declared == file_type or _is_structured(data, file_type) else 'text'
+    if file_type == 'unknown':
+        try:
+            data.decode('utf-8')
+            return 'text'
+        except UnicodeDecodeError:
+            return 'unknown'
+    return file_type
+
+
+def extract_embedded_payloads(html: str, max_size: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Decode every atob() and base64 data URI payload of a page
+    
+    Args:
+        html: Page HTML
+        max_size: Skip payloads that decode to more bytes than this
         
-        return decoded_str
+    Returns:
+        Payloads in page order as {'source': 'atob' or 'data_uri', 'mime',
+        'file_type', 'data'}, where file_type is 'text' for page text and
+        otherwise a file_sniffer type; identical payloads are returned once.
+        atob() payloads are page text unless their magic bytes say otherwise,
+        data URIs are files unless declared or sniffed as text
+    """
+    payloads = []
+    try:
+        raw = html.encode('utf-8')
+        view = memoryview(raw)
+        matches = [('atob', '', m.start(1), m.end(1)) for m in _ATOB_PAYLOAD.finditer(raw)]
+        matches += [('data_uri', (m.group(1) or b'').decode('ascii').lower(), m.start(2), m.end(2))
+                    for m in _DATA_URI_PAYLOAD.finditer(raw)]
+        seen = set()
+        for source, mime, start, end in sorted(matches, key=lambda m: m[2]):
+            if max_size is not None and (end - start) * 3 // 4 > max_size:
+                logger.warning(f"Skipping embedded payload of ~{(end - start) * 3 // 4} bytes")
+                continue
+            data = _b64decode(view[start:end], _URLSAFE_CHARS.search(raw, start, end) is not None)
+            if not data or data in seen:
+                continue
+            seen.add(data)
+            payloads.append({
+                "source": source,
+                "mime": mime,
+                "file_type": _payload_type(data, mime, source),
+                "data": data
+            })
     except Exception as e:
-        logger.error(f"Error decoding base64: {e}")
-        return None
+        logger.error(f"Error extracting embedded payloads: {e}")
+    return payloads
 
 
 def encode_base64(data: bytes) -> str:
@@ -0,0 +1,165 @@
+"""
+Startup warmup and readiness reporting
+
+The first quiz after a deploy would otherwise pay for DNS resolution, the TLS
+handshake to the LLM endpoint, lazy parser imports and parse pool start-up.
+warm_up() does that work before traffic arrives, and readiness() tells the load
+balancer whether this worker is warm and has capacity left.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from openai import AsyncOpenAI
+
+from config import Config
+from data_processor import DataProcessor
+from file_handle import JobMemory, TableHandle
+from file_sniffer import sniff_content
+from json_stream import IncrementalJSONParser
+from model_router import validate_analysis
+from parse_pool import parse_file, pool_stats, warm_parse_pool
+from rate_limiter import get_download_slots, get_llm_limiter
+
+logger = logging.getLogger(__name__)
+
+_state: Dict[str, Any] = {
+    "warm": False,
+    "started_at": None,
+    "seconds": None,
+    "steps": {}
+}
+
+_SAMPLE_CSV = b"name,score\nalpha,3\nbeta,5\ngamma,7\n"
+_SAMPLE_REPLY = '{"submit_url": "https://example.com/submit", "task_type": "calculation", "answer": 15}'
+
+
+def _llm_host(client: Optional[AsyncOpenAI]) -> Optional[str]:
+    if client is not None:
+        return client.base_url.host
+    return urlparse(os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')).hostname
+
+
+async def _resolve_llm_host(client: Optional[AsyncOpenAI]):
+    host = _llm_host(client)
+    if host:
+        await asyncio.get_running_loop().getaddrinfo(host, 443)
+
+
+async def _connect_llm(client: Optional[AsyncOpenAI]):
+    # Opens (and keeps in the client's pool) a TLS connection to the endpoint
+    if client is not None:
+        await client.models.list()
+
+
+async def _import_parsers():
+    def load():
+        processor = DataProcessor()
+        processor.analyze_dataframe(processor.read_csv(_SAMPLE_CSV))
+        # pandas imports the Excel engine lazily on first use
+        import openpyxl  # noqa: F401
+    await asyncio.to_thread(load)
+
+
+async def _synthetic_solve():
+    """Run a canned quiz step through the local pipeline, without network or LLM calls"""
+    file_type = sniff_content(_SAMPLE_CSV, 'warmup.csv')
+    parsed = await parse_file(file_type, _SAMPLE_CSV)
+    handle = TableHandle(parsed['table'], JobMemory(Config.MAX_JOB_MEMORY), name='warmup')
+    try:
+        with handle.materialize() as df:
+            total = int(df['score'].sum())
+    finally:
+        handle.release()
+
+    parser = IncrementalJSONParser()
+    for i in range(0, len(_SAMPLE_REPLY), 16):
+        parser.feed(_SAMPLE_REPLY[i:i + 16])
+    analysis = parser.result() or {}
+    if analysis.get('answer') != total or validate_analysis(analysis, "What is the total score?"):
+        raise RuntimeError("Synthetic solve produced an unexpected answer")
+
+
+async def warm_up(client: Optional[AsyncOpenAI] = None) -> Dict[str, Any]:
+    """
+    Prepare this worker for its first quiz
+
+    Every step is best-effort: a failure is logged and recorded, but the worker
+    is still marked warm so a flaky endpoint cannot keep it out of rotation.
+
+    Args:
+        client: Shared LLM client to pre-connect; DNS is still resolved without one
+
+    Returns:
+        Warmup state with per-step timings
+    """
+    steps = [
+        ("resolve_llm_host", lambda: _resolve_llm_host(client)),
+        ("connect_llm", lambda: _connect_llm(client)),
+        ("import_parsers", _import_parsers),
+        ("parse_pool", warm_parse_pool),
+        ("synthetic_solve", _synthetic_solve),
+    ]
+    _state["started_at"] = time.time()
+    start = time.monotonic()
+
+    for name, step in steps:
+        step_start = time.monotonic()
+        try:
+            await asyncio.wait_for(step(), Config.WARMUP_STEP_TIMEOUT)
+            _state["steps"][name] = {"ok": True, "seconds": round(time.monotonic() - step_start, 3)}
+        except Exception as e:
+            logger.warning(f"Warmup step {name} failed: {e!r}")
+            _state["steps"][name] = {"ok": False, "error": repr(e)}
+
+    _state["seconds"] = round(time.monotonic() - start, 3)
+    _state["warm"] = True
+    logger.info(f"Warmup finished in {_state['seconds']}s")
+    return warmup_state()
+
+
+def warmup_state() -> Dict[str, Any]:
+    return {**_state, "steps": dict(_state["steps"])}
+
+
+def readiness(in_flight: int = 0) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Whether this worker should receive new quizzes
+
+    A worker is ready once warm and while it still has a free LLM slot and a
+    free parse pool slot, or at least nobody queued for them.
+
+    Args:
+        in_flight: Quiz chains currently being solved by this worker
+
+    Returns:
+        (ready, report with warm state, queue depths and free slots)
+    """
+    llm = get_llm_limiter()
+    llm_slots = llm.global_slots
+    downloads = get_download_slots()
+    pool = pool_stats()
+
+    llm_saturated = llm_slots.available <= 0 and llm_slots.waiting > 0
+    pool_saturated = pool.get("started", False) and pool["in_use"] >= pool["limit"] and pool["waiting"] > 0
+    ready = _state["warm"] and not llm_saturated and not pool_saturated
+
+    return ready, {
+        "ready": ready,
+        "warm": _state["warm"],
+        "in_flight": in_flight,
+        "llm": {
+            "free_slots": llm_slots.available,
+            "queue_depth": llm_slots.waiting,
+            "saturated": llm_saturated,
+            "paused_for": llm.stats()["paused_for"]
+        },
+        "downloads": {
+            "free_slots": downloads.available,
+            "queue_depth": downloads.waiting
+        },
+        "parse_pool": {**pool, "saturated": pool_saturated}
+    }